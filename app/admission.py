@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from fastapi import HTTPException
+
+from app import metrics
+
+T = TypeVar("T")
+
+
+class AdmissionController:
+    """
+    Bounded admission in front of the guard and the LLM call.
+    At most `max_concurrency` chat requests run at once and up to `max_queue` more wait, each for at most
+    `queue_timeout` seconds. Beyond that, requests are turned away at once: 429 when the queue is full,
+    503 when the wait times out, both with Retry-After. Overload then shows up as fast rejections
+    instead of every request getting slower.
+    """
+
+    def __init__(self, max_concurrency: int | None = None, max_queue: int | None = None,
+                 queue_timeout: float | None = None, retry_after: int | None = None):
+        self.max_concurrency = max(1, int(max_concurrency if max_concurrency is not None else os.getenv("ADMISSION_MAX_CONCURRENCY", "32")))
+        self.max_queue = int(max_queue if max_queue is not None else os.getenv("ADMISSION_MAX_QUEUE", "64"))
+        self.queue_timeout = float(queue_timeout if queue_timeout is not None else os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+        self.retry_after = int(retry_after if retry_after is not None else os.getenv("ADMISSION_RETRY_AFTER", "2"))
+        self._slots: asyncio.Semaphore | None = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.deduplicated = 0
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        metrics.ADMISSION_REJECTED.inc(reason=reason)
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after)})
+
+    async def acquire(self):
+        """Take a concurrency slot, waiting in the bounded queue if needed; pair with release()."""
+        if self._slots is None:
+            # Created lazily so it binds to the serving event loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_full += 1
+                self._reject(429, "queue_full", "PACE is busy right now, please try again in a moment.")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                self._reject(503, "timeout", "PACE is overloaded, please try again in a moment.")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold one concurrency slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run `fn` under admission, sharing the result with identical requests already in flight.
+        A resend of the same message in the same session (double submit, client retry) waits for the
+        first one instead of classifying and generating twice and storing the turn twice.
+        """
+        existing = self._inflight.get(key)
+        if existing is not None:
+            self.deduplicated += 1
+            metrics.ADMISSION_DEDUPLICATED.inc()
+            return await asyncio.shield(existing)
+
+        async def admitted():
+            async with self.admit():
+                return await fn()
+
+        task = asyncio.ensure_future(admitted())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t))
+        # Shielded: if the first caller disconnects, later duplicates still get the result
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        # Mark the exception as retrieved; every waiter re-raises it from its own await
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "deduplicated": self.deduplicated,
+            "inflight_keys": len(self._inflight),
+        }
@@ -1,9 +1,14 @@
 from __future__ import annotations
+import json
+import math
 import os
+import random
+import zlib
 from dataclasses import dataclass
-from typing import Dict, Tuple
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 
-from transformers import pipeline
+from app.guard_cache import GuardCache, normalize_text
 
 REFUSAL = (
     "I am an empathy coach, not a medical, legal or technical advisor. "
@@ -28,42 +33,206 @@ DESCRIPTIONS: Dict[str, str] = {
 
 HYPOTHESIS_TEMPLATE = "This message is about {}."
 
+# Run through the model once at startup so the first real request doesn't pay for lazy initialisation
+WARMUP_TEXTS = [
+    "My son has been on his phone until 3 AM every night this week.",
+    "How can I read my daughter's messages without her knowing?",
+    "My teen refuses to talk to us at dinner and goes straight to her room.",
+]
+
 @dataclass
 class GuardResult:
     label: str
     confidence: float
     scores: Dict[str, float]
 
+def parse_label_thresholds(spec: str | None) -> Dict[str, float]:
+    """Parse "LABEL=0.7,LABEL=0.5" (GUARD_LABEL_THRESHOLDS) into per-label refusal thresholds."""
+    thresholds: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        label, _, value = part.partition("=")
+        label = label.strip()
+        if label not in DESCRIPTIONS or label == LABEL_IN:
+            raise ValueError(f"GUARD_LABEL_THRESHOLDS: '{label}' is not an out-of-scope guard label")
+        thresholds[label] = float(value)
+    return thresholds
+
+def is_refusal(res: GuardResult, threshold: float, label_thresholds: Dict[str, float] | None = None) -> bool:
+    """Refuse when the top label is out of scope and its score reaches that label's threshold."""
+    if res.label == LABEL_IN:
+        return False
+    return res.confidence >= (label_thresholds or {}).get(res.label, threshold)
+
+class CascadeClassifier:
+    """
+    Cheap first stage in front of BART: hashed word/char n-grams + a linear softmax model over the guard labels.
+    Verdicts above the confidence bands are returned directly; everything else falls through to BART.
+    Keep both bands at or above GUARD_THRESHOLD so a direct out-of-scope verdict is also a refusal.
+    """
+
+    def __init__(self, labels: List[str], weights: Dict[str, Dict[int, float]], bias: Dict[str, float],
+                 dim: int = 2 ** 18, accept: float | None = None, reject: float | None = None):
+        self.labels = labels
+        self.weights = weights
+        self.bias = bias
+        self.dim = dim
+        # Minimum probability to pass an in-domain message / refuse an out-of-scope one without BART
+        self.accept = float(accept if accept is not None else os.getenv("GUARD_CASCADE_ACCEPT", "0.95"))
+        self.reject = float(reject if reject is not None else os.getenv("GUARD_CASCADE_REJECT", "0.97"))
+        self.checked = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    @staticmethod
+    def features(text: str, dim: int) -> Dict[int, float]:
+        words = normalize_text(text).split()
+        grams = [f"w:{w}" for w in words]
+        grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for w in words:
+            padded = f" {w} "
+            grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        feats: Dict[int, float] = {}
+        for g in grams:
+            idx = zlib.crc32(g.encode("utf-8")) % dim
+            feats[idx] = feats.get(idx, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in feats.values())) or 1.0
+        return {i: v / norm for i, v in feats.items()}
+
+    def _probs(self, feats: Dict[int, float]) -> Dict[str, float]:
+        logits = {}
+        for lbl in self.labels:
+            w = self.weights[lbl]
+            logits[lbl] = self.bias[lbl] + sum(w.get(i, 0.0) * v for i, v in feats.items())
+        top = max(logits.values())
+        exp = {lbl: math.exp(z - top) for lbl, z in logits.items()}
+        total = sum(exp.values())
+        return {lbl: e / total for lbl, e in exp.items()}
+
+    def predict(self, text: str) -> Dict[str, float]:
+        return self._probs(self.features(text, self.dim))
+
+    def decide(self, text: str) -> Optional[GuardResult]:
+        """Return a verdict when confident, or None to defer to BART."""
+        self.checked += 1
+        scores = self.predict(text)
+        best = max(scores, key=scores.get)
+        if best == LABEL_IN and scores[best] >= self.accept:
+            self.accepted += 1
+        elif best != LABEL_IN and scores[best] >= self.reject:
+            self.rejected += 1
+        else:
+            return None
+        return GuardResult(label=best, confidence=scores[best], scores=scores)
+
+    def stats(self) -> Dict[str, float]:
+        skipped = self.accepted + self.rejected
+        return {
+            "checked": self.checked,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "skipped_bart_fraction": (skipped / self.checked) if self.checked else 0.0,
+        }
+
+    @classmethod
+    def train(cls, texts: List[str], targets: List[Dict[str, float]], dim: int = 2 ** 18,
+              epochs: int = 30, lr: float = 0.5, l2: float = 1e-5, seed: int = 0) -> "CascadeClassifier":
+        """Fit on soft targets (e.g. BART score vectors) with plain SGD on the cross-entropy."""
+        labels = list(DESCRIPTIONS.keys())
+        model = cls(labels, {lbl: {} for lbl in labels}, {lbl: 0.0 for lbl in labels}, dim=dim)
+        data = [(cls.features(t, dim), y) for t, y in zip(texts, targets)]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for feats, y in data:
+                probs = model._probs(feats)
+                for lbl in labels:
+                    grad = probs[lbl] - y.get(lbl, 0.0)
+                    model.bias[lbl] -= lr * grad
+                    w = model.weights[lbl]
+                    for i, v in feats.items():
+                        w[i] = w.get(i, 0.0) * (1 - lr * l2) - lr * grad * v
+        return model
+
+    def save(self, path: str | Path):
+        payload = {
+            "dim": self.dim,
+            "labels": self.labels,
+            "bias": self.bias,
+            "weights": {lbl: {str(i): round(v, 6) for i, v in w.items() if abs(v) > 1e-6} for lbl, w in self.weights.items()},
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(payload))
+
+    @classmethod
+    def load(cls, path: str | Path) -> "CascadeClassifier":
+        payload = json.loads(Path(path).read_text())
+        weights = {lbl: {int(i): v for i, v in w.items()} for lbl, w in payload["weights"].items()}
+        return cls(payload["labels"], weights, payload["bias"], dim=payload["dim"])
+
 class BartGuard:
-    def __init__(self, model_name: str | None = None, threshold: float | None = None):
+    def __init__(self, model_name: str | None = None, threshold: float | None = None, backend: str | None = None,
+                 cascade_path: str | None = None, label_thresholds: str | None = None, load_model: bool = True):
         self.model_name = model_name or os.getenv("BART_MODEL", "facebook/bart-large-mnli")
         self.threshold = float(threshold if threshold is not None else os.getenv("GUARD_THRESHOLD", "0.60"))
-        # CPU by default; set device=0 if you have GPU
-        self.classifier = pipeline(
-            "zero-shot-classification",
-            model=self.model_name,
-            device=-1,
+        # Optional overrides of `threshold` for individual out-of-scope labels
+        self.label_thresholds = parse_label_thresholds(
+            label_thresholds if label_thresholds is not None else os.getenv("GUARD_LABEL_THRESHOLDS")
         )
+        # torch | onnx | onnx-int8 | distilled | pipeline (see app/guard_engine.py)
+        self.backend = backend or os.getenv("BART_BACKEND", "torch")
+        hypotheses = {label: HYPOTHESIS_TEMPLATE.format(desc) for label, desc in DESCRIPTIONS.items()}
+        # Imported here so modules that only need GuardResult/labels (e.g. the guard client) don't load torch
+        from app.guard_engine import build_engine
+
+        # load_model=False keeps only the settings, cache and cascade (the parent of a GuardPool)
+        self.engine = build_engine(self.backend, self.model_name, hypotheses) if load_model else None
+        self.cache = GuardCache()
+        # Optional first stage; unset GUARD_CASCADE_PATH to send everything to BART
+        cascade_path = cascade_path or os.getenv("GUARD_CASCADE_PATH")
+        self.cascade = CascadeClassifier.load(cascade_path) if cascade_path else None
+
+    def warmup(self):
+        """Score a few dummy messages (single and batched), bypassing the cache and cascade."""
+        self.engine.score(WARMUP_TEXTS[:1])
+        self.engine.score(WARMUP_TEXTS)
 
     def classify(self, text: str) -> GuardResult:
-        candidates = list(DESCRIPTIONS.values())
-        out = self.classifier(
-            sequences=text,
-            candidate_labels=candidates,
-            hypothesis_template=HYPOTHESIS_TEMPLATE,
-            multi_label=False,
-        )
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: List[str]) -> List[GuardResult]:
+        """Classify several messages with a single padded forward pass over all premise/hypothesis pairs."""
+        results: List[GuardResult | None] = [None] * len(texts)
+        pending: Dict[tuple, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = self.cache.key(self.model_name, self.threshold, text)
+            if key in pending:
+                pending[key].append(i)
+                continue
+            hit = self.cache.get(key)
+            if hit is None and self.cascade is not None:
+                hit = self.cascade.decide(text)
+                if hit is not None:
+                    self.cache.put(key, hit)
+            if hit is not None:
+                results[i] = hit
+            else:
+                pending[key] = [i]
 
-        desc_to_label = {v: k for k, v in DESCRIPTIONS.items()}
-        scores = {desc_to_label[lbl]: float(score) for lbl, score in zip(out["labels"], out["scores"])}
+        # Cache hits and confident cascade verdicts skip BART; duplicates within a batch are scored once
+        keys = list(pending)
+        for key, scores in zip(keys, self.engine.score([texts[pending[k][0]] for k in keys])):
+            best_label = max(scores, key=scores.get)
+            res = GuardResult(label=best_label, confidence=scores[best_label], scores=scores)
+            self.cache.put(key, res)
+            for i in pending[key]:
+                results[i] = GuardResult(label=res.label, confidence=res.confidence, scores=dict(scores))
+        return results
 
-        best_desc = out["labels"][0]
-        best_score = float(out["scores"][0])
-        best_label = desc_to_label[best_desc]
-        return GuardResult(label=best_label, confidence=best_score, scores=scores)
+    def is_refusal(self, res: GuardResult) -> bool:
+        return is_refusal(res, self.threshold, self.label_thresholds)
 
     def should_refuse(self, text: str) -> Tuple[bool, GuardResult]:
         res = self.classify(text)
-        if res.label != LABEL_IN and res.confidence >= self.threshold:
-            return True, res
-        return False, res
\ No newline at end of file
+        return self.is_refusal(res), res
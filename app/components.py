@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict
+
+from fastapi import HTTPException
+
+from app.groq_client import AsyncGroqClient
+from app.guard_pool import build_guard_runner
+from app.guard_service import GuardClient
+from app.llm_router import RoutingLLMClient
+from app.ollama_client import AsyncOllamaClient
+from app.session_manager import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class Components:
+    """
+    Heavy components (guard model, LLM client) loaded in the background after startup, so importing
+    app.main and dev-server reloads stay fast. Handlers await readiness; /readyz reports it.
+    """
+
+    def __init__(self, session_store: SessionStore, guard_mode: str | None = None):
+        self.session_store = session_store
+        # "local": this process loads the model; "sidecar": classify through the shared guard server (pace-guard)
+        self.guard_mode = guard_mode or os.getenv("GUARD_MODE", "local")
+        # "ollama": hedge slow Groq calls and fail over to a local Ollama model (see app/llm_router.py)
+        self.llm_fallback = os.getenv("LLM_FALLBACK", "none").lower()
+        self.ready_timeout = float(os.getenv("READY_WAIT_TIMEOUT", "30"))
+        self.guard = None
+        self.llm = None
+        self.errors: Dict[str, str] = {}
+        self.guard_load_s: float | None = None
+        self._task: asyncio.Task | None = None
+        self._guard_ready = asyncio.Event()
+        self._llm_ready = asyncio.Event()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._load())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if isinstance(self.guard, GuardClient):
+            await self.guard.close()
+
+    async def _load(self):
+        await asyncio.gather(self._load_llm(), self._load_guard())
+
+    async def _load_llm(self):
+        try:
+            if self.llm_fallback == "ollama":
+                self.llm = RoutingLLMClient(AsyncGroqClient(), AsyncOllamaClient())
+            else:
+                self.llm = AsyncGroqClient()
+            self.session_store.groq = self.llm
+            self._llm_ready.set()
+        except Exception as e:
+            self.errors["llm"] = repr(e)
+            logger.error("LLM client failed to load: %r", e)
+
+    async def _load_guard(self):
+        start = time.perf_counter()
+        try:
+            if self.guard_mode == "sidecar":
+                client = GuardClient()
+                while True:
+                    try:
+                        await client.ping()
+                        break
+                    except OSError as e:
+                        self.errors["guard"] = f"waiting for guard server: {e!r}"
+                        await asyncio.sleep(1.0)
+                self.guard = client
+            else:
+                # Model load + warmup are blocking; keep them off the event loop
+                self.guard = await asyncio.to_thread(build_guard_runner)
+            self.errors.pop("guard", None)
+            self.guard_load_s = time.perf_counter() - start
+            self._guard_ready.set()
+        except Exception as e:
+            self.errors["guard"] = repr(e)
+            logger.error("Guard failed to load: %r", e)
+
+    @property
+    def ready(self) -> bool:
+        return self._guard_ready.is_set() and self._llm_ready.is_set()
+
+    async def wait_ready(self):
+        """Start loading if nobody has yet, then wait for it; 503 if it takes longer than READY_WAIT_TIMEOUT."""
+        self.start()
+        if self.ready:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(self._guard_ready.wait(), self._llm_ready.wait()), self.ready_timeout
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="PACE is starting up, try again shortly.",
+                headers={"Retry-After": "5"},
+            )
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "guard": self._guard_ready.is_set(),
+            "guard_mode": self.guard_mode,
+            "guard_load_s": self.guard_load_s,
+            "llm": self._llm_ready.is_set(),
+            "errors": self.errors,
+        }
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Set
+
+from app import metrics
+from app.session_manager import SessionStore
+
+logger = logging.getLogger(__name__)
+
+
+class ContextUpdater:
+    """
+    Runs SessionStore.update_derived_context as background jobs, off the /chat critical path.
+    Jobs are coalesced per session: while an update is queued, further messages for that session
+    don't add work, and a message arriving during a running update schedules exactly one follow-up.
+    Requests always read the newest finished context and never wait on a running job.
+    """
+
+    def __init__(self, session_store: SessionStore, workers: int | None = None):
+        self.store = session_store
+        self.workers = max(1, int(workers if workers is not None else os.getenv("CONTEXT_WORKERS", "2")))
+        self._queue: asyncio.Queue | None = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending: Dict[str, float] = {}  # session_id -> enqueue time of the oldest unserved request
+        self._running: Set[str] = set()
+        self.scheduled = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        """Start the worker tasks on the running event loop."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def schedule(self, session_id: str):
+        self.start()
+        self.scheduled += 1
+        if session_id in self._pending:
+            self.coalesced += 1
+            return
+        self._pending[session_id] = time.monotonic()
+        # A running job for this session re-queues it when it finishes
+        if session_id not in self._running:
+            self._queue.put_nowait(session_id)
+
+    async def _worker(self):
+        while True:
+            session_id = await self._queue.get()
+            enqueued_at = self._pending.pop(session_id, None)
+            if enqueued_at is None:
+                continue
+            self._running.add(session_id)
+            started = time.perf_counter()
+            try:
+                await self.store.update_derived_context(session_id)
+            except Exception as e:
+                self.failed += 1
+                logger.error("Error in context job for session %s: %r", session_id, e)
+            else:
+                self.completed += 1
+            finally:
+                metrics.CONTEXT_SECONDS.observe(time.perf_counter() - started)
+                self._running.discard(session_id)
+                self.last_lag = time.monotonic() - enqueued_at
+                self.max_lag = max(self.max_lag, self.last_lag)
+                if session_id in self._pending:
+                    self._queue.put_nowait(session_id)
+
+    def stats(self) -> Dict[str, float]:
+        now = time.monotonic()
+        return {
+            "queue_depth": len(self._pending),
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+            # seconds from a message being committed to its context update finishing
+            "last_lag_s": self.last_lag,
+            "max_lag_s": self.max_lag,
+            "oldest_pending_s": (now - min(self._pending.values())) if self._pending else 0.0,
+        }
@@ -1,18 +1,60 @@
+import json
 import os
+import re
+import time
+from typing import AsyncIterator, Dict
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 
+from app.http_pool import shared_async_client, sync_timeout
+
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+_DURATION_UNITS = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_reset(value: str | None) -> float | None:
+    """Groq reset headers look like "7.66s", "2m59.56s" or "120ms"; returns seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(num) * _DURATION_UNITS[unit] for num, unit in parts)
 
-class GroqClient:
-    """Minimal Groq chat client using the OpenAI-compatible REST API."""
 
-    def __init__(self, api_key: str | None = None, base_url: str | None = None, timeout: int = 600):
+def parse_rate_limit(headers, status: int) -> Dict[str, float | None]:
+    """The x-ratelimit-* (and retry-after) headers of a Groq response, as numbers."""
+    def number(name):
+        value = headers.get(name)
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    return {
+        "status": status,
+        "observed_at": time.monotonic(),
+        "limit_requests": number("x-ratelimit-limit-requests"),
+        "remaining_requests": number("x-ratelimit-remaining-requests"),
+        "reset_requests_s": parse_reset(headers.get("x-ratelimit-reset-requests")),
+        "limit_tokens": number("x-ratelimit-limit-tokens"),
+        "remaining_tokens": number("x-ratelimit-remaining-tokens"),
+        "reset_tokens_s": parse_reset(headers.get("x-ratelimit-reset-tokens")),
+        "retry_after_s": number("retry-after"),
+    }
+
+
+class _GroqBase:
+    def __init__(self, api_key: str | None = None, base_url: str | None = None):
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
         if not self.api_key:
             raise RuntimeError("Missing GROQ_API_KEY (set it in your environment or .env).")
         self.base_url = (base_url or os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")).rstrip("/")
-        self.timeout = timeout
 
-    def chat(self, model: str, messages: list, temperature: float = 0.25, max_tokens: int = 180):
+    def _request(self, model: str, messages: list, temperature: float, max_tokens: int, stream: bool = False):
         url = f"{self.base_url}/chat/completions"
         payload = {
             "model": model,
@@ -21,11 +63,67 @@ class GroqClient:
             "max_tokens": max_tokens,
             "top_p": 0.9,
         }
+        if stream:
+            payload["stream"] = True
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
-        resp = requests.post(url, json=payload, headers=headers, timeout=self.timeout)
+        return url, payload, headers
+
+
+class GroqClient(_GroqBase):
+    """Minimal Groq chat client using the OpenAI-compatible REST API."""
+
+    def __init__(self, api_key: str | None = None, base_url: str | None = None, timeout=None):
+        super().__init__(api_key, base_url)
+        self.timeout = timeout if timeout is not None else sync_timeout()
+        # Keep-alive session so repeated calls reuse the TCP+TLS connection
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "50"))))
+
+    def chat(self, model: str, messages: list, temperature: float = 0.25, max_tokens: int = 180):
+        url, payload, headers = self._request(model, messages, temperature, max_tokens)
+        resp = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
+
+
+class AsyncGroqClient(_GroqBase):
+    """Async Groq client on the shared pooled httpx connection (see app/http_pool.py)."""
+
+    def __init__(self, api_key: str | None = None, base_url: str | None = None, client: httpx.AsyncClient | None = None):
+        super().__init__(api_key, base_url)
+        self._client = client
+        # Rate-limit headers of the most recent response (see parse_rate_limit); empty until the first call
+        self.rate_limit: Dict[str, float | None] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or shared_async_client()
+
+    async def chat(self, model: str, messages: list, temperature: float = 0.25, max_tokens: int = 180):
+        url, payload, headers = self._request(model, messages, temperature, max_tokens)
+        resp = await self.client.post(url, json=payload, headers=headers)
+        self.rate_limit = parse_rate_limit(resp.headers, resp.status_code)
         resp.raise_for_status()
         data = resp.json()
-        return data["choices"][0]["message"]["content"]
\ No newline at end of file
+        return data["choices"][0]["message"]["content"]
+
+    async def chat_stream(self, model: str, messages: list, temperature: float = 0.25, max_tokens: int = 180) -> AsyncIterator[str]:
+        """Yields content deltas as Groq produces them (OpenAI-style server-sent events)."""
+        url, payload, headers = self._request(model, messages, temperature, max_tokens, stream=True)
+        async with self.client.stream("POST", url, json=payload, headers=headers) as resp:
+            self.rate_limit = parse_rate_limit(resp.headers, resp.status_code)
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
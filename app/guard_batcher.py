@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Tuple
+
+from app.bart_guard import BartGuard, GuardResult
+
+
+class GuardBatcher:
+    """
+    Dynamic micro-batching in front of BartGuard.
+    Concurrent callers are held for up to GUARD_BATCH_WAIT_MS (or until GUARD_BATCH_SIZE
+    messages are pending) and classified together in one padded forward pass.
+    """
+
+    def __init__(self, guard: BartGuard, max_batch_size: int | None = None, max_wait_ms: float | None = None):
+        self.guard = guard
+        self.max_batch_size = max(1, int(max_batch_size if max_batch_size is not None else os.getenv("GUARD_BATCH_SIZE", "8")))
+        self.max_wait_ms = float(max_wait_ms if max_wait_ms is not None else os.getenv("GUARD_BATCH_WAIT_MS", "5"))
+        self._queue: "Queue[Optional[Tuple[str, Future]]]" = Queue()
+        self._batches = 0
+        self._items = 0
+        self._worker = threading.Thread(target=self._run, name="guard-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def classify(self, text: str) -> GuardResult:
+        return self.submit(text).result()
+
+    def should_refuse(self, text: str) -> Tuple[bool, GuardResult]:
+        res = self.classify(text)
+        return self.guard.is_refusal(res), res
+
+    async def should_refuse_async(self, text: str) -> Tuple[bool, GuardResult]:
+        """Awaitable variant for async handlers; the event loop is free while the batch runs."""
+        res = await asyncio.wrap_future(self.submit(text))
+        return self.guard.is_refusal(res), res
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": (self._items / self._batches) if self._batches else 0.0,
+            "pending": self._queue.qsize(),
+            "cache": self.guard.cache.stats(),
+            "cascade": self.guard.cascade.stats() if self.guard.cascade else None,
+        }
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self) -> List[Optional[Tuple[str, Future]]]:
+        batch = [self._queue.get()]
+        if batch[0] is None:
+            return batch
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1] is None
+            live = [(text, fut) for text, fut in (b for b in batch if b is not None) if fut.set_running_or_notify_cancel()]
+            if live:
+                try:
+                    results = self.guard.classify_batch([text for text, _ in live])
+                except Exception as e:
+                    for _, fut in live:
+                        fut.set_exception(e)
+                else:
+                    for (_, fut), res in zip(live, results):
+                        fut.set_result(res)
+                self._batches += 1
+                self._items += len(live)
+            if stop:
+                return
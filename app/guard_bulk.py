@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict, Iterable, Iterator, List
+
+from app.bart_guard import GuardResult
+
+# Fields tried, in order, when no text field is given
+TEXT_FIELDS = ("text", "situation", "input", "body")
+
+
+def bulk_window() -> int:
+    """Messages read ahead and sorted by length at a time; bounds memory for arbitrarily large inputs."""
+    return max(1, int(os.getenv("GUARD_BULK_WINDOW", "256")))
+
+
+def parse_record(line: str, line_no: int, field: str | None = None, id_field: str = "id") -> Dict:
+    """
+    One JSONL input line -> {"line", "id", "text"}, or {"line", "error"} if it cannot be screened.
+    A line may be a JSON object (text taken from `field`, or the first of TEXT_FIELDS present) or a bare JSON string.
+    """
+    try:
+        value = json.loads(line)
+    except ValueError as e:
+        return {"line": line_no, "error": f"invalid JSON: {e}"}
+    if isinstance(value, str):
+        record_id, text = None, value
+    elif isinstance(value, dict):
+        record_id = value.get(id_field)
+        names = (field,) if field else TEXT_FIELDS
+        text = next((value[n] for n in names if isinstance(value.get(n), str)), None)
+        if text is None:
+            return {"line": line_no, "id": record_id, "error": f"no text field ({', '.join(names)})"}
+    else:
+        return {"line": line_no, "error": "expected a JSON object or string"}
+    if not text.strip():
+        return {"line": line_no, "id": record_id, "error": "empty text"}
+    return {"line": line_no, "id": record_id, "text": text}
+
+
+def result_record(record: Dict, refused: bool, res: GuardResult, scores: bool = False) -> Dict:
+    out = {
+        "line": record["line"],
+        "id": record["id"],
+        "refused": refused,
+        "label": res.label,
+        "confidence": round(res.confidence, 6),
+    }
+    if scores:
+        out["scores"] = {label: round(s, 6) for label, s in res.scores.items()}
+    return out
+
+
+def windows(lines: Iterable[str], size: int, field: str | None = None, id_field: str = "id") -> Iterator[List[Dict]]:
+    """Parse non-blank lines lazily and group them into windows of at most `size` records."""
+    window: List[Dict] = []
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        window.append(parse_record(line, line_no, field, id_field))
+        if len(window) >= size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def length_buckets(records: List[Dict], batch_size: int) -> List[List[Dict]]:
+    """
+    Screenable records sorted by length and cut into batches, so each padded forward pass holds
+    messages of similar length instead of padding every short message to the longest one in the file.
+    """
+    ordered = sorted((r for r in records if "text" in r), key=lambda r: len(r["text"]))
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
+def classify_lines(guard, lines: Iterable[str], batch_size: int = 32, window: int | None = None,
+                   field: str | None = None, id_field: str = "id", scores: bool = False) -> Iterator[Dict]:
+    """
+    Screen JSONL lines with a BartGuard, yielding one result per non-blank input line, in input order.
+    Only `window` records are held at a time; within a window they are classified in length buckets.
+    """
+    for records in windows(lines, window or bulk_window(), field, id_field):
+        verdicts: Dict[int, Dict] = {}
+        for bucket in length_buckets(records, batch_size):
+            for record, res in zip(bucket, guard.classify_batch([r["text"] for r in bucket])):
+                verdicts[record["line"]] = result_record(record, guard.is_refusal(res), res, scores)
+        for record in records:
+            yield verdicts.get(record["line"], record)
+
+
+async def aiter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a streamed request body into lines without reading it all into memory."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *complete, buffer = buffer.split(b"\n")
+        for line in complete:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+
+async def classify_lines_async(guard, lines: AsyncIterator[str], window: int | None = None,
+                               field: str | None = None, id_field: str = "id", scores: bool = False) -> AsyncIterator[Dict]:
+    """
+    Async variant for the server: messages go through the guard's `should_refuse_async` (the in-process
+    batcher or the sidecar), submitted shortest first so its micro-batches come out length-bucketed.
+    """
+    size = window or bulk_window()
+    records: List[Dict] = []
+    line_no = 0
+
+    async def flush():
+        ordered = sorted((r for r in records if "text" in r), key=lambda r: len(r["text"]))
+        verdicts = await asyncio.gather(*(guard.should_refuse_async(r["text"]) for r in ordered))
+        by_line = {r["line"]: result_record(r, refuse, res, scores) for r, (refuse, res) in zip(ordered, verdicts)}
+        return [by_line.get(r["line"], r) for r in records]
+
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        records.append(parse_record(line, line_no, field, id_field))
+        if len(records) >= size:
+            for out in await flush():
+                yield out
+            records = []
+    if records:
+        for out in await flush():
+            yield out
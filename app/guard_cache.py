@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.bart_guard import GuardResult
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so near-identical resends share a key."""
+    text = _PUNCT.sub(" ", (text or "").lower())
+    return _SPACES.sub(" ", text).strip()
+
+
+class GuardCache:
+    """
+    Bounded LRU cache of guard verdicts with optional TTL.
+    Keys are (model name, threshold, normalized text).
+    """
+
+    def __init__(self, max_size: int | None = None, ttl: float | None = None):
+        self.max_size = int(max_size if max_size is not None else os.getenv("GUARD_CACHE_SIZE", "1024"))
+        # 0 means entries never expire
+        self.ttl = float(ttl if ttl is not None else os.getenv("GUARD_CACHE_TTL", "0"))
+        self._entries: "OrderedDict[Tuple[str, float, str], Tuple[float, GuardResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model_name: str, threshold: float, text: str) -> Tuple[str, float, str]:
+        return (model_name, threshold, normalize_text(text))
+
+    def get(self, key: Tuple[str, float, str]) -> Optional[GuardResult]:
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, res = entry
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return replace(res, scores=dict(res.scores))
+
+    def put(self, key: Tuple[str, float, str], res: GuardResult):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), res)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
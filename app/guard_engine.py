@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+
+def entailment_index(config) -> int:
+    # Same lookup the transformers zero-shot pipeline uses
+    for label, idx in config.label2id.items():
+        if label.lower().startswith("entail"):
+            return int(idx)
+    return -1
+
+
+class NliEngine:
+    """
+    Zero-shot NLI scoring without the transformers pipeline.
+    Each premise is paired with every fixed hypothesis in one tokenizer call, truncating only the premise
+    and padding only to the longest pair in the batch. Subclasses provide `logits`.
+    """
+
+    def __init__(self, model_name: str, hypotheses: Dict[str, str], config):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.labels = list(hypotheses.keys())
+        self.hypotheses = list(hypotheses.values())
+        self.entailment_id = entailment_index(config)
+        max_len = self.tokenizer.model_max_length
+        if max_len > 100_000:  # tokenizer has no real limit configured
+            max_len = getattr(config, "max_position_embeddings", 512)
+        self.max_length = max_len
+
+    def encode(self, texts: List[str]) -> Dict[str, torch.Tensor]:
+        """Build the padded (len(texts) * len(labels), max_len) pair batch."""
+        premises = [text for text in texts for _ in self.hypotheses]
+        # truncation="only_first": shorten the premise, never the hypothesis
+        batch = self.tokenizer(
+            premises,
+            self.hypotheses * len(texts),
+            truncation="only_first",
+            max_length=self.max_length,
+            padding="longest",
+            return_tensors="pt",
+        )
+        return {k: v for k, v in batch.items() if k in ("input_ids", "attention_mask", "token_type_ids")}
+
+    def logits(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        raise NotImplementedError
+
+    def score(self, texts: List[str]) -> List[Dict[str, float]]:
+        if not texts:
+            return []
+        logits = self.logits(self.encode(texts))
+        entail = logits[:, self.entailment_id].reshape(len(texts), len(self.labels))
+        probs = torch.softmax(entail.float(), dim=-1).tolist()
+        return [dict(zip(self.labels, row)) for row in probs]
+
+
+class TorchNliEngine(NliEngine):
+    """Runs the PyTorch model directly under torch.inference_mode."""
+
+    def __init__(self, model_name: str, hypotheses: Dict[str, str]):
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.model.eval()
+        super().__init__(model_name, hypotheses, self.model.config)
+
+    def logits(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.model(**batch).logits
+
+
+class PipelineNliEngine:
+    """The original transformers zero-shot pipeline path, kept as a reference for parity checks."""
+
+    def __init__(self, model_name: str, hypotheses: Dict[str, str]):
+        # CPU by default; set device=0 if you have GPU
+        self.classifier = pipeline("zero-shot-classification", model=model_name, device=-1)
+        self.candidates = list(hypotheses.values())
+        self.hyp_to_label = {v: k for k, v in hypotheses.items()}
+
+    def score(self, texts: List[str]) -> List[Dict[str, float]]:
+        if not texts:
+            return []
+        outs = self.classifier(
+            sequences=list(texts),
+            candidate_labels=self.candidates,
+            hypothesis_template="{}",
+            multi_label=False,
+            batch_size=len(texts) * len(self.candidates),
+        )
+        if isinstance(outs, dict):
+            outs = [outs]
+        return [
+            {self.hyp_to_label[lbl]: float(score) for lbl, score in zip(out["labels"], out["scores"])}
+            for out in outs
+        ]
+
+
+class DistilledEngine:
+    """
+    Single-pass classifier distilled from BART (scripts/distill_guard.py).
+    One forward pass per message instead of one per label; the checkpoint's id2label holds the guard labels.
+    """
+
+    def __init__(self, model_path: str, hypotheses: Dict[str, str]):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        self.model.eval()
+        id2label = {int(i): lbl for i, lbl in self.model.config.id2label.items()}
+        missing = set(hypotheses) - set(id2label.values())
+        if missing:
+            raise ValueError(f"Distilled guard at {model_path} is missing labels: {', '.join(sorted(missing))}")
+        self.columns = [(i, lbl) for i, lbl in sorted(id2label.items()) if lbl in hypotheses]
+
+    def score(self, texts: List[str]) -> List[Dict[str, float]]:
+        if not texts:
+            return []
+        batch = self.tokenizer(list(texts), padding=True, truncation=True, return_tensors="pt")
+        with torch.inference_mode():
+            logits = self.model(**batch).logits
+        probs = torch.softmax(logits[:, [i for i, _ in self.columns]].float(), dim=-1).tolist()
+        return [{lbl: p for (_, lbl), p in zip(self.columns, row)} for row in probs]
+
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "distilled", "pipeline")
+
+
+def build_engine(backend: str, model_name: str, hypotheses: Dict[str, str]):
+    if backend == "torch":
+        return TorchNliEngine(model_name, hypotheses)
+    if backend in ("onnx", "onnx-int8"):
+        # onnxruntime is optional; only import it when an ONNX backend is selected
+        from app.guard_onnx import OnnxNliEngine
+
+        return OnnxNliEngine(model_name, hypotheses, quantized=backend == "onnx-int8")
+    if backend == "distilled":
+        # model_name points at the saved student checkpoint
+        return DistilledEngine(model_name, hypotheses)
+    if backend == "pipeline":
+        return PipelineNliEngine(model_name, hypotheses)
+    raise ValueError(f"Unknown BART_BACKEND '{backend}' (expected one of: {', '.join(BACKENDS)})")
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from app.bart_guard import DESCRIPTIONS, HYPOTHESIS_TEMPLATE, LABEL_IN, GuardResult, is_refusal
+
+
+class ScoreCache:
+    """
+    Per-input guard score vectors on disk, so threshold tuning never reruns BART.
+    An entry's key covers everything the scores depend on: model, backend, hypothesis template,
+    every label description and the input text. Editing a description or switching models
+    changes the keys, and only those inputs are scored again.
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or os.getenv("GUARD_SCORE_CACHE", "data/guard_scores.json"))
+        self.entries: Dict[str, Dict[str, float]] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_name: str, backend: str, descriptions: Dict[str, str], text: str) -> str:
+        raw = json.dumps([model_name, backend, HYPOTHESIS_TEMPLATE, sorted(descriptions.items()), text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries))
+        os.replace(tmp, self.path)
+
+
+def score_texts(texts: List[str], model_name: str, backend: str, descriptions: Dict[str, str] | None = None,
+                cache: ScoreCache | None = None, batch_size: int = 16) -> List[Dict[str, float]]:
+    """Guard score vectors for `texts`; only inputs missing from the cache are run through the model."""
+    descriptions = descriptions or DESCRIPTIONS
+    cache = cache or ScoreCache()
+    keys = [cache.key(model_name, backend, descriptions, text) for text in texts]
+    missing = list(dict.fromkeys(k for k in keys if k not in cache.entries))
+    cache.hits += len(keys) - len(missing)
+    cache.misses += len(missing)
+    if missing:
+        # Built only when needed, so a fully cached sweep never loads torch
+        from app.guard_engine import build_engine
+
+        hypotheses = {label: HYPOTHESIS_TEMPLATE.format(desc) for label, desc in descriptions.items()}
+        engine = build_engine(backend, model_name, hypotheses)
+        text_of = dict(zip(keys, texts))
+        for i in range(0, len(missing), batch_size):
+            chunk = missing[i:i + batch_size]
+            for key, scores in zip(chunk, engine.score([text_of[k] for k in chunk])):
+                cache.entries[key] = scores
+        cache.save()
+    return [cache.entries[k] for k in keys]
+
+
+def top_result(scores: Dict[str, float]) -> GuardResult:
+    label = max(scores, key=scores.get)
+    return GuardResult(label=label, confidence=scores[label], scores=scores)
+
+
+def refusal_metrics(cases: List[dict], results: List[GuardResult], threshold: float,
+                    label_thresholds: Dict[str, float] | None = None) -> dict:
+    """Precision/recall of refusals (refusal is the positive class), plus refusal rate per category."""
+    tp = fp = fn = tn = 0
+    per_category: Dict[str, Dict[str, int]] = {}
+    for case, res in zip(cases, results):
+        refused = is_refusal(res, threshold, label_thresholds)
+        expected = case["expected_refusal"]
+        tp += refused and expected
+        fp += refused and not expected
+        fn += expected and not refused
+        tn += not refused and not expected
+        cat = per_category.setdefault(case["category"], {"total": 0, "refused": 0, "correct": 0})
+        cat["total"] += 1
+        cat["refused"] += refused
+        cat["correct"] += refused == expected
+
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return {
+        "threshold": threshold,
+        "label_thresholds": dict(label_thresholds or {}),
+        "precision": precision,
+        "recall": recall,
+        "f1": (2 * precision * recall / (precision + recall)) if precision + recall else 0.0,
+        "accuracy": (tp + tn) / len(cases) if cases else 0.0,
+        "refusal_rate": (tp + fp) / len(cases) if cases else 0.0,
+        "categories": {
+            name: {"refusal_rate": c["refused"] / c["total"], "accuracy": c["correct"] / c["total"], "total": c["total"]}
+            for name, c in per_category.items()
+        },
+    }
+
+
+def frange(start: float, stop: float, step: float) -> List[float]:
+    count = int(round((stop - start) / step))
+    return [round(start + i * step, 6) for i in range(count + 1)]
+
+
+def sweep_thresholds(cases: List[dict], results: List[GuardResult], thresholds: Iterable[float]) -> List[dict]:
+    return [refusal_metrics(cases, results, t) for t in thresholds]
+
+
+def sweep_label_thresholds(cases: List[dict], results: List[GuardResult], base_threshold: float,
+                           thresholds: Iterable[float], rounds: int = 2) -> Tuple[Dict[str, float], dict]:
+    """
+    Coordinate ascent on F1: tune one out-of-scope label's threshold at a time, holding the others fixed,
+    starting from `base_threshold` for every label. Ties keep the higher threshold (fewer refusals).
+    """
+    thresholds = sorted(thresholds)
+    labels = [label for label in DESCRIPTIONS if label != LABEL_IN]
+    current = {label: base_threshold for label in labels}
+    best = refusal_metrics(cases, results, base_threshold, current)
+    for _ in range(rounds):
+        changed = False
+        for label in labels:
+            for t in thresholds:
+                candidate = refusal_metrics(cases, results, base_threshold, {**current, label: t})
+                if (candidate["f1"], t) >= (best["f1"], current[label]):
+                    if t != current[label]:
+                        changed = True
+                    current[label] = t
+                    best = candidate
+        if not changed:
+            break
+    return current, best
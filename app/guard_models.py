@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List
+
+
+@dataclass
+class GuardModel:
+    name: str
+    family: str
+    notes: str
+
+
+# Zero-shot NLI checkpoints that work with the guard's engine unchanged: a sequence-classification head
+# whose config has an "entailment" label. Keyed by a short alias; BART_MODEL takes the `name`.
+GUARD_MODELS: Dict[str, GuardModel] = {
+    "bart-large": GuardModel("facebook/bart-large-mnli", "bart", "current default"),
+    "distilbart-12-9": GuardModel("valhalla/distilbart-mnli-12-9", "bart", "BART-large encoder, 9 decoder layers"),
+    "distilbart-12-6": GuardModel("valhalla/distilbart-mnli-12-6", "bart", "BART-large encoder, 6 decoder layers"),
+    "distilbart-12-3": GuardModel("valhalla/distilbart-mnli-12-3", "bart", "BART-large encoder, 3 decoder layers"),
+    "distilbart-12-1": GuardModel("valhalla/distilbart-mnli-12-1", "bart", "BART-large encoder, 1 decoder layer"),
+    "deberta-v3-large": GuardModel("MoritzLaurer/DeBERTa-v3-large-mnli-fever-anli-ling-wanli", "deberta", "most accurate, slowest"),
+    "deberta-v3-base": GuardModel("MoritzLaurer/DeBERTa-v3-base-mnli-fever-anli", "deberta", "base-size DeBERTa"),
+    "deberta-v3-xsmall": GuardModel("MoritzLaurer/deberta-v3-xsmall-zeroshot-v1.1-all-33", "deberta", "trained for zero-shot, 2-way NLI"),
+    "minilm-l6": GuardModel("cross-encoder/nli-MiniLM2-L6-H768", "minilm", "6-layer cross-encoder"),
+    "xtremedistil-l6": GuardModel("MoritzLaurer/xtremedistil-l6-h256-zeroshot-v1.1-all-33", "minilm", "smallest, trained for zero-shot"),
+}
+
+
+def resolve_models(names: List[str] | None = None) -> List[GuardModel]:
+    """Registry aliases or Hugging Face ids -> GuardModel; everything in the registry when `names` is empty."""
+    if not names:
+        return list(GUARD_MODELS.values())
+    by_name = {m.name: m for m in GUARD_MODELS.values()}
+    models = []
+    for name in names:
+        model = GUARD_MODELS.get(name) or by_name.get(name)
+        models.append(model or GuardModel(name, "custom", "not in the registry"))
+    return models
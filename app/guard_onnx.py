@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+from app.guard_engine import NliEngine
+
+try:
+    import onnxruntime as ort
+except ImportError:  # optional dependency, only needed for BART_BACKEND=onnx / onnx-int8
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+
+def onnx_cache_dir() -> Path:
+    return Path(os.getenv("BART_ONNX_CACHE", Path.home() / ".cache" / "pace" / "onnx"))
+
+
+class _LogitsOnly(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):
+        kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            kwargs["token_type_ids"] = token_type_ids
+        return self.model(**kwargs).logits
+
+
+def _publish(tmp_dir: Path, out_dir: Path, model_file: str):
+    """Move an export out of its temp directory: external weight files first, the graph itself last."""
+    files = sorted(tmp_dir.iterdir(), key=lambda f: f.name == model_file)
+    for f in files:
+        os.replace(f, out_dir / f.name)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def export_onnx(model_name: str, quantized: bool = False, cache_dir: Path | None = None) -> Path:
+    """
+    One-time export of the NLI model to ONNX (and dynamic int8 quantization).
+    Files are cached on disk, so later startups only load the graph.
+    """
+    out_dir = (cache_dir or onnx_cache_dir()) / model_name.replace("/", "__")
+    fp32_path = out_dir / "model.onnx"
+    int8_path = out_dir / "model.int8.onnx"
+    target = int8_path if quantized else fp32_path
+    if target.exists():
+        return target
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if not fp32_path.exists():
+        logger.info("Exporting %s to ONNX at %s (one-time step)...", model_name, fp32_path)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        dummy = tokenizer(["My son stays up late."], ["This message is about parenting."], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask"]
+        if "token_type_ids" in dummy:
+            input_names.append("token_type_ids")
+        dynamic_axes = {name: {0: "pairs", 1: "sequence"} for name in input_names}
+        dynamic_axes["logits"] = {0: "pairs"}
+        # Exported under its final file name in a temp directory, so any external weight file
+        # (model.onnx.data) keeps the name the graph refers to when it is moved into place
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".export-", dir=out_dir))
+        # The TorchScript exporter: the dynamo exporter (default since torch 2.9) fails on BART's
+        # attention-mask checks with dynamic_axes, and its graphs break quantize_dynamic
+        with torch.no_grad():
+            torch.onnx.export(
+                _LogitsOnly(model),
+                tuple(dummy[name] for name in input_names),
+                str(tmp_dir / fp32_path.name),
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                dynamo=False,
+            )
+        _publish(tmp_dir, out_dir, fp32_path.name)
+        del model
+        gc.collect()
+
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("Quantizing %s to int8 at %s (one-time step)...", fp32_path.name, int8_path)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".quantize-", dir=out_dir))
+        quantize_dynamic(str(fp32_path), str(tmp_dir / int8_path.name), weight_type=QuantType.QInt8)
+        _publish(tmp_dir, out_dir, int8_path.name)
+    return target
+
+
+class OnnxNliEngine(NliEngine):
+    """Zero-shot NLI engine backed by ONNX Runtime (fp32 or dynamically quantized int8)."""
+
+    def __init__(self, model_name: str, hypotheses: Dict[str, str], quantized: bool = False):
+        if ort is None:
+            raise RuntimeError(
+                "BART_BACKEND=onnx requires onnxruntime and onnx (uv pip install onnxruntime onnx)."
+            )
+        super().__init__(model_name, hypotheses, AutoConfig.from_pretrained(model_name))
+        self.model_path = export_onnx(model_name, quantized=quantized)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(self.model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def logits(self, batch: Dict[str, torch.Tensor]) -> torch.Tensor:
+        feed = {name: batch[name].numpy() for name in self.input_names}
+        return torch.from_numpy(self.session.run(["logits"], feed)[0])
+
+
+if __name__ == "__main__":
+    # Pre-build the ONNX files (e.g. in a Docker build step) so pods never export at startup
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    name = os.getenv("BART_MODEL", "facebook/bart-large-mnli")
+    logger.info("fp32 graph: %s", export_onnx(name, quantized=False))
+    logger.info("int8 graph: %s", export_onnx(name, quantized=True))
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty
+from typing import Dict, List, Tuple
+
+from app.bart_guard import BartGuard, GuardResult
+
+
+def guard_replicas() -> int:
+    """GUARD_REPLICAS > 1 runs the guard as a pool of model replicas instead of one batched instance."""
+    return max(1, int(os.getenv("GUARD_REPLICAS", "1")))
+
+
+def available_cores() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(cores: List[int], replicas: int, threads: int) -> List[List[int]]:
+    """Consecutive, non-overlapping core slices of `threads` cores per replica (wrapping if oversubscribed)."""
+    return [[cores[(i * threads + j) % len(cores)] for j in range(threads)] for i in range(replicas)]
+
+
+def _replica_main(index: int, engine, settings: Dict[str, object], cores: List[int], threads: int,
+                  max_batch_size: int, max_wait_ms: float, requests, results):
+    """
+    Replica process: pin to its cores, warm up, then classify micro-batches from its own queue.
+    `engine` is the parent's engine with its weights in shared memory, or None to load a private copy.
+    """
+    import torch
+
+    try:
+        if cores and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+        if engine is None:
+            guard = BartGuard(**settings)
+        else:
+            guard = BartGuard(**settings, load_model=False)
+            guard.engine = engine
+        # The parent answers cache hits and cascade verdicts; replicas only run the model
+        guard.cache.max_size = 0
+        guard.cascade = None
+        guard.warmup()
+        results.put(("ready", index, os.getpid()))
+        while True:
+            item = requests.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + max_wait_ms / 1000.0
+            while len(batch) < max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = requests.get(timeout=remaining)
+                except Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+            try:
+                out = guard.classify_batch([text for _, text in batch])
+            except Exception as e:
+                results.put(("error", index, [(req_id, repr(e)) for req_id, _ in batch]))
+            else:
+                results.put(("ok", index, [(req_id, res) for (req_id, _), res in zip(batch, out)]))
+            if stop:
+                return
+    except KeyboardInterrupt:
+        # Ctrl-C reaches the whole process group; the parent handles shutdown
+        pass
+
+
+class GuardPool:
+    """
+    N guard replicas in spawned processes, each pinned to its own slice of the cores with its own
+    torch.set_num_threads, behind a dispatcher that sends each message to the least-loaded replica.
+    Short messages stop gaining from intra-op threads after a few cores; separate replicas keep the rest busy.
+
+    Replicas are spawned, not forked: the pool is usually created from a worker thread of a running server,
+    and forking a multi-threaded process can leave locks held in the child. For torch engines the weights
+    are loaded once, here, moved to shared memory and handed to the replicas through torch.multiprocessing,
+    so N replicas map the same pages. Other backends (ONNX, pipeline) cannot be shared that way; each replica
+    then loads its own copy (pass a BartGuard(load_model=False) to skip the unused one here).
+    This process never runs inference; it keeps the verdict cache and the cascade, and only cache misses
+    the cascade cannot settle are sent to a replica. Same interface as GuardBatcher.
+    """
+
+    def __init__(self, guard: BartGuard, replicas: int | None = None, threads: int | None = None,
+                 max_batch_size: int | None = None, max_wait_ms: float | None = None, start_timeout: float | None = None):
+        self.guard = guard
+        self.replicas = max(1, int(replicas if replicas is not None else guard_replicas()))
+        cores = available_cores()
+        # 0 (default): split the cores evenly between the replicas
+        threads = int(threads if threads is not None else os.getenv("GUARD_REPLICA_THREADS", "0"))
+        self.threads = threads if threads > 0 else max(1, len(cores) // self.replicas)
+        self.max_batch_size = max(1, int(max_batch_size if max_batch_size is not None else os.getenv("GUARD_BATCH_SIZE", "8")))
+        self.max_wait_ms = float(max_wait_ms if max_wait_ms is not None else os.getenv("GUARD_BATCH_WAIT_MS", "5"))
+        start_timeout = float(start_timeout if start_timeout is not None else os.getenv("GUARD_POOL_START_TIMEOUT", "300"))
+        self.cores = partition_cores(cores, self.replicas, self.threads)
+
+        settings = {"model_name": guard.model_name, "backend": guard.backend, "threshold": guard.threshold}
+        model = getattr(guard.engine, "model", None)
+        engine = None
+        if hasattr(model, "share_memory"):
+            model.share_memory()
+            engine = guard.engine
+        self.shared_weights = engine is not None
+
+        # torch's spawn context pickles shared tensors as handles to the same memory, not as copies
+        import torch.multiprocessing
+
+        ctx = torch.multiprocessing.get_context("spawn")
+        self._results = ctx.Queue()
+        self._requests = [ctx.Queue() for _ in range(self.replicas)]
+        self._lock = threading.Lock()
+        self._futures: Dict[int, Tuple[int, Future, tuple]] = {}
+        self._ids = itertools.count()
+        self.inflight = [0] * self.replicas
+        self.items = [0] * self.replicas
+        self.batches = [0] * self.replicas
+        self.alive = [True] * self.replicas
+        self.pids = [0] * self.replicas
+        self._closing = False
+        self._processes = [
+            ctx.Process(
+                target=_replica_main,
+                args=(i, engine, settings, self.cores[i], self.threads, self.max_batch_size, self.max_wait_ms,
+                      self._requests[i], self._results),
+                name=f"guard-replica-{i}",
+                daemon=True,
+            )
+            for i in range(self.replicas)
+        ]
+        for p in self._processes:
+            p.start()
+        self._wait_ready(start_timeout)
+        self._collector = threading.Thread(target=self._collect, name="guard-pool", daemon=True)
+        self._collector.start()
+
+    def _wait_ready(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        ready = 0
+        while ready < self.replicas:
+            try:
+                kind, index, pid = self._results.get(timeout=1.0)
+            except Empty:
+                dead = [p.name for p in self._processes if not p.is_alive()]
+                if dead or time.monotonic() > deadline:
+                    self._terminate()
+                    raise RuntimeError(f"Guard replicas failed to start: {', '.join(dead) or 'timed out'}")
+                continue
+            if kind == "ready":
+                self.pids[index] = pid
+                ready += 1
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        key = self.guard.cache.key(self.guard.model_name, self.guard.threshold, text)
+        hit = self.guard.cache.get(key)
+        if hit is None and self.guard.cascade is not None:
+            hit = self.guard.cascade.decide(text)
+            if hit is not None:
+                self.guard.cache.put(key, hit)
+        if hit is not None:
+            fut.set_result(hit)
+            return fut
+        with self._lock:
+            live = [i for i in range(self.replicas) if self.alive[i]]
+            if not live:
+                fut.set_exception(RuntimeError("No guard replica is running"))
+                return fut
+            index = min(live, key=lambda i: self.inflight[i])
+            req_id = next(self._ids)
+            self._futures[req_id] = (index, fut, key)
+            self.inflight[index] += 1
+        self._requests[index].put((req_id, text))
+        return fut
+
+    def classify(self, text: str) -> GuardResult:
+        return self.submit(text).result()
+
+    def should_refuse(self, text: str) -> Tuple[bool, GuardResult]:
+        res = self.classify(text)
+        return self.guard.is_refusal(res), res
+
+    async def should_refuse_async(self, text: str) -> Tuple[bool, GuardResult]:
+        res = await asyncio.wrap_future(self.submit(text))
+        return self.guard.is_refusal(res), res
+
+    def _collect(self):
+        while True:
+            try:
+                kind, index, payload = self._results.get(timeout=1.0)
+            except Empty:
+                self._reap()
+                continue
+            except (EOFError, OSError):
+                return
+            if kind == "stop":
+                return
+            with self._lock:
+                self.batches[index] += 1
+                done = [(self._futures.pop(req_id, None), value) for req_id, value in payload]
+                self.inflight[index] -= len(payload)
+                self.items[index] += len(payload)
+            for entry, value in done:
+                if entry is None:
+                    continue
+                _, fut, key = entry
+                if kind == "ok":
+                    self.guard.cache.put(key, value)
+                    fut.set_result(value)
+                else:
+                    fut.set_exception(RuntimeError(f"Guard replica {index} failed: {value}"))
+
+    def _reap(self):
+        """Fail the pending requests of replicas that died, and stop dispatching to them."""
+        if self._closing:
+            return
+        for index, p in enumerate(self._processes):
+            if self.alive[index] and not p.is_alive():
+                with self._lock:
+                    self.alive[index] = False
+                    lost = [rid for rid, (i, _, _) in self._futures.items() if i == index]
+                    entries = [self._futures.pop(rid) for rid in lost]
+                    self.inflight[index] = 0
+                for _, fut, _ in entries:
+                    fut.set_exception(RuntimeError(f"Guard replica {index} exited (code {p.exitcode})"))
+
+    def stats(self) -> Dict[str, float]:
+        items = sum(self.items)
+        batches = sum(self.batches)
+        return {
+            "replicas": self.replicas,
+            "threads_per_replica": self.threads,
+            "shared_weights": self.shared_weights,
+            "batches": batches,
+            "items": items,
+            "avg_batch_size": (items / batches) if batches else 0.0,
+            "pending": sum(self.inflight),
+            "per_replica": [
+                {"pid": self.pids[i], "cores": self.cores[i], "alive": self.alive[i], "inflight": self.inflight[i],
+                 "items": self.items[i], "batches": self.batches[i]}
+                for i in range(self.replicas)
+            ],
+            "cache": self.guard.cache.stats(),
+            "cascade": self.guard.cascade.stats() if self.guard.cascade else None,
+        }
+
+    def close(self):
+        self._closing = True
+        for q in self._requests:
+            q.put(None)
+        for p in self._processes:
+            p.join(timeout=10)
+        self._terminate()
+        self._results.put(("stop", -1, None))
+        self._collector.join()
+
+    def _terminate(self):
+        for p in self._processes:
+            if p.is_alive():
+                p.terminate()
+                p.join()
+
+
+def build_guard_runner():
+    """GuardPool when GUARD_REPLICAS > 1, otherwise one warmed-up BartGuard behind a GuardBatcher."""
+    from app.guard_batcher import GuardBatcher
+
+    guard = BartGuard()
+    if guard_replicas() > 1:
+        # No warmup here: the replicas warm up on the shared weights
+        return GuardPool(guard)
+    guard.warmup()
+    return GuardBatcher(guard)
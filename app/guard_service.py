@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+from typing import Dict, Tuple
+
+from app.bart_guard import GuardResult
+
+logger = logging.getLogger(__name__)
+
+
+def guard_socket_path() -> str:
+    return os.getenv("GUARD_SOCKET", "/tmp/pace-guard.sock")
+
+
+def _result_from(msg: dict) -> GuardResult:
+    return GuardResult(label=msg["label"], confidence=msg["confidence"], scores=msg["scores"])
+
+
+class GuardServer:
+    """
+    Sidecar guard process: owns the only copy of the BART model and serves classifications to the
+    web workers over a Unix socket. Protocol is newline-delimited JSON, pipelined per connection:
+    {"id": 1, "text": "..."} -> {"id": 1, "refused": false, "label": "...", "confidence": 0.9, "scores": {...}}
+    {"id": 2, "op": "stats"} -> {"id": 2, "stats": {...}}
+    Requests from all connections go through one GuardBatcher (or GuardPool), so concurrent workers share batches.
+    """
+
+    def __init__(self, socket_path: str | None = None, batcher=None):
+        self.socket_path = socket_path or guard_socket_path()
+        if batcher is None:
+            from app.guard_pool import build_guard_runner
+
+            # A GuardPool when GUARD_REPLICAS > 1
+            batcher = build_guard_runner()
+        self.batcher = batcher
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info("Guard server listening on %s", self.socket_path)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    # Answer just this line; the other pipelined requests on the connection carry on
+                    coro = self._write({"id": None, "error": f"malformed request: {e!r}"}, writer, write_lock)
+                else:
+                    coro = self._respond(req, writer, write_lock)
+                task = asyncio.create_task(coro)
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def _respond(self, req: dict, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        try:
+            if req.get("op") == "stats":
+                body = {"stats": self.batcher.stats()}
+            else:
+                refuse, res = await self.batcher.should_refuse_async(req["text"])
+                body = {"refused": refuse, "label": res.label, "confidence": res.confidence, "scores": res.scores}
+        except Exception as e:
+            body = {"error": repr(e)}
+        body["id"] = req.get("id")
+        await self._write(body, writer, write_lock)
+
+    async def _write(self, body: dict, writer: asyncio.StreamWriter, write_lock: asyncio.Lock):
+        async with write_lock:
+            writer.write(json.dumps(body).encode("utf-8") + b"\n")
+            await writer.drain()
+
+
+class GuardClient:
+    """
+    Thin client for GuardServer with the same should_refuse API as GuardBatcher.
+    The async path keeps one multiplexed connection per process; the sync path opens a short-lived one.
+    """
+
+    def __init__(self, socket_path: str | None = None, timeout: float | None = None):
+        self.socket_path = socket_path or guard_socket_path()
+        self.timeout = float(timeout if timeout is not None else os.getenv("GUARD_CLIENT_TIMEOUT", "30"))
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._connect_lock: asyncio.Lock | None = None
+        self._reader_task: asyncio.Task | None = None
+        # Futures of requests sent on the current connection; each connection gets its own dict
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count()
+
+    async def _connect(self):
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            if self._reader_task is not None:
+                # The old connection is closing; its reader fails whatever was still waiting on it
+                self._reader_task.cancel()
+            self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            self._pending = {}
+            self._reader_task = asyncio.create_task(self._read_loop(self._reader, self._writer, self._pending))
+
+    async def _read_loop(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         pending: Dict[int, asyncio.Future]):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                fut = pending.pop(msg.get("id"), None)
+                if fut is not None and not fut.done():
+                    fut.set_result(msg)
+        finally:
+            # Whatever ends the loop (EOF, a bad line, close()), nothing more will arrive for this connection
+            writer.close()
+            if self._writer is writer:
+                self._writer = None
+            for fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(ConnectionError("guard server closed the connection"))
+            pending.clear()
+
+    async def close(self):
+        """Stop the reader and close the connection; requests still waiting fail with ConnectionError."""
+        task, self._reader_task = self._reader_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _call(self, payload: dict) -> dict:
+        await self._connect()
+        request_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        pending, writer = self._pending, self._writer
+        pending[request_id] = fut
+        try:
+            writer.write(json.dumps({**payload, "id": request_id}).encode("utf-8") + b"\n")
+            await writer.drain()
+            msg = await asyncio.wait_for(fut, self.timeout)
+        finally:
+            pending.pop(request_id, None)
+        if "error" in msg:
+            raise RuntimeError(f"guard server error: {msg['error']}")
+        return msg
+
+    def _call_sync(self, payload: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps({**payload, "id": 0}).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                msg = json.loads(f.readline())
+        if "error" in msg:
+            raise RuntimeError(f"guard server error: {msg['error']}")
+        return msg
+
+    async def should_refuse_async(self, text: str) -> Tuple[bool, GuardResult]:
+        msg = await self._call({"text": text})
+        return msg["refused"], _result_from(msg)
+
+    def should_refuse(self, text: str) -> Tuple[bool, GuardResult]:
+        msg = self._call_sync({"text": text})
+        return msg["refused"], _result_from(msg)
+
+    def classify(self, text: str) -> GuardResult:
+        return self.should_refuse(text)[1]
+
+    async def ping(self):
+        """Raises OSError until the guard server is up and answering."""
+        await self._call({"op": "stats"})
+
+    def stats(self) -> dict:
+        try:
+            return self._call_sync({"op": "stats"})["stats"]
+        except OSError as e:
+            return {"error": f"guard server unreachable: {e!r}"}
+
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    # pace-guard runs on its own, outside uvicorn's logging setup
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    asyncio.run(GuardServer().serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+from typing import Tuple
+
+import httpx
+
+_shared: httpx.AsyncClient | None = None
+
+
+def llm_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "200")),
+        max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "50")),
+        keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def llm_timeout() -> httpx.Timeout:
+    # Per-phase timeouts instead of one 600 s budget; read covers the gap between response bytes
+    return httpx.Timeout(
+        connect=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+        read=float(os.getenv("LLM_READ_TIMEOUT", "60")),
+        write=float(os.getenv("LLM_WRITE_TIMEOUT", "10")),
+        pool=float(os.getenv("LLM_POOL_TIMEOUT", "5")),
+    )
+
+
+def sync_timeout() -> Tuple[float, float]:
+    """(connect, read) tuple for the requests-based clients."""
+    return float(os.getenv("LLM_CONNECT_TIMEOUT", "5")), float(os.getenv("LLM_READ_TIMEOUT", "60"))
+
+
+def shared_async_client() -> httpx.AsyncClient:
+    """One pooled keep-alive client shared by every async LLM client in the process."""
+    global _shared
+    if _shared is None or _shared.is_closed:
+        _shared = httpx.AsyncClient(limits=llm_limits(), timeout=llm_timeout())
+    return _shared
+
+
+async def close_shared_async_client():
+    global _shared
+    if _shared is not None and not _shared.is_closed:
+        await _shared.aclose()
+    _shared = None
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict
+
+import httpx
+
+from app import metrics
+from app.groq_client import AsyncGroqClient
+from app.ollama_client import AsyncOllamaClient
+from app.speculation import StreamPump
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failures` consecutive errors (429s included); open -> half-open after `cooldown`
+    seconds, when one trial call is let through. A success closes it, a failure opens it again.
+    """
+
+    def __init__(self, failures: int | None = None, cooldown: float | None = None):
+        self.failures = max(1, int(failures if failures is not None else os.getenv("LLM_BREAKER_FAILURES", "5")))
+        self.cooldown = float(cooldown if cooldown is not None else os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+        self.consecutive = 0
+        self.opened_at: float | None = None
+        self.open_for = self.cooldown
+        self.trial_running = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.open_for:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self, retry_after: float | None = None):
+        self.consecutive += 1
+        failed_trial = self.trial_running
+        self.trial_running = False
+        if failed_trial or self.consecutive >= self.failures:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+            # A 429 with Retry-After keeps the breaker open at least that long
+            self.open_for = max(self.cooldown, retry_after or 0.0)
+
+    def abandon_trial(self):
+        """The half-open trial call was cancelled (a hedge won) without a verdict; let the next call try."""
+        self.trial_running = False
+
+
+def _retry_after(error: BaseException) -> float | None:
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429:
+        try:
+            return float(error.response.headers.get("retry-after", ""))
+        except ValueError:
+            return None
+    return None
+
+
+class RoutingLLMClient:
+    """
+    Drop-in for AsyncGroqClient (same chat / chat_stream API) that adds a local Ollama fallback:
+    - hedging: if Groq has not answered (or, when streaming, sent its first token) within the hedge delay,
+      the same request also goes to Ollama and the first good answer wins; the other is cancelled
+    - failover: a Groq error goes straight to Ollama instead of becoming the canned error reply
+    - circuit breaker: after repeated Groq failures or 429s, calls skip Groq until the cooldown ends
+    The hedge delay tracks the LLM_HEDGE_PERCENTILE latency of recent Groq calls.
+    """
+
+    def __init__(self, primary: AsyncGroqClient, fallback: AsyncOllamaClient, fallback_model: str | None = None,
+                 breaker: CircuitBreaker | None = None, hedge_percentile: float | None = None,
+                 initial_hedge_delay_ms: float | None = None, min_hedge_delay_ms: float | None = None,
+                 window: int | None = None):
+        self.primary = primary
+        self.fallback = fallback
+        self.fallback_model = fallback_model or os.getenv("LLAMA_MODEL", "llama3.1:latest")
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_percentile = float(hedge_percentile if hedge_percentile is not None else os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        # Used until enough Groq latencies have been observed; 0 disables hedging (failover only)
+        self.initial_hedge_delay = float(initial_hedge_delay_ms if initial_hedge_delay_ms is not None else os.getenv("LLM_HEDGE_DELAY_MS", "2000")) / 1000.0
+        self.min_hedge_delay = float(min_hedge_delay_ms if min_hedge_delay_ms is not None else os.getenv("LLM_HEDGE_MIN_DELAY_MS", "200")) / 1000.0
+        window = int(window if window is not None else os.getenv("LLM_HEDGE_WINDOW", "200"))
+        # Separate windows: a full reply and a time-to-first-token are different distributions
+        self._latencies: Dict[str, Deque[float]] = {"chat": deque(maxlen=window), "stream": deque(maxlen=window)}
+        self.calls = 0
+        self.hedged = 0
+        self.failovers = 0
+        self.wins = {"primary": 0, "fallback": 0}
+
+    @property
+    def rate_limit(self) -> dict:
+        return self.primary.rate_limit
+
+    def hedge_delay(self, kind: str) -> float | None:
+        """Seconds to wait for Groq before also asking Ollama; None when hedging is off."""
+        if self.initial_hedge_delay <= 0:
+            return None
+        samples = self._latencies[kind]
+        if len(samples) < 20:
+            return self.initial_hedge_delay
+        ordered = sorted(samples)
+        idx = min(len(ordered) - 1, int(round(self.hedge_percentile / 100 * (len(ordered) - 1))))
+        return max(self.min_hedge_delay, ordered[idx])
+
+    def _primary_failed(self, kind: str, error: BaseException):
+        self.breaker.record_failure(_retry_after(error))
+        metrics.LLM_ERRORS.inc(kind=f"groq_{kind}")
+        logger.warning("Groq %s failed (breaker %s): %r", kind, self.breaker.state, error)
+
+    def _won(self, winner: str):
+        self.wins[winner] += 1
+
+    async def chat(self, model: str, messages: list, temperature: float = 0.25, max_tokens: int = 180):
+        self.calls += 1
+        ask_fallback = lambda: self.fallback.chat(self.fallback_model, messages, temperature, num_predict=max_tokens)
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self._won("fallback")
+            return await ask_fallback()
+
+        start = time.monotonic()
+        primary = asyncio.ensure_future(self.primary.chat(model, messages, temperature, max_tokens))
+        try:
+            return await self._chat_race(primary, ask_fallback, start)
+        finally:
+            # Still set only if the trial call ended without a verdict (hedge won, or caller went away)
+            if trial and self.breaker.trial_running:
+                self.breaker.abandon_trial()
+
+    async def _chat_race(self, primary: asyncio.Future, ask_fallback, start: float):
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay("chat"))
+        if done:
+            try:
+                result = primary.result()
+            except Exception as e:
+                self._primary_failed("chat", e)
+                self.failovers += 1
+                metrics.LLM_RETRIES.inc(kind="failover")
+                self._won("fallback")
+                return await ask_fallback()
+            self._latencies["chat"].append(time.monotonic() - start)
+            self.breaker.record_success()
+            self._won("primary")
+            return result
+
+        # Groq is slower than usual: hedge with Ollama and take whichever good answer lands first
+        self.hedged += 1
+        metrics.LLM_RETRIES.inc(kind="hedge")
+        backup = asyncio.ensure_future(ask_fallback())
+        pending = {primary, backup}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        if task is primary:
+                            self._primary_failed("chat", e)
+                        error = e
+                        continue
+                    # A losing Groq call still contributes its elapsed time, as a lower bound of its latency
+                    self._latencies["chat"].append(time.monotonic() - start)
+                    if task is primary:
+                        self.breaker.record_success()
+                    self._won("primary" if task is primary else "fallback")
+                    return result
+            raise error
+        finally:
+            for task in (primary, backup):
+                if not task.done():
+                    task.cancel()
+
+    async def chat_stream(self, model: str, messages: list, temperature: float = 0.25, max_tokens: int = 180) -> AsyncIterator[str]:
+        self.calls += 1
+        ask_fallback = lambda: StreamPump(self.fallback.chat_stream(self.fallback_model, messages, temperature, num_predict=max_tokens))
+        trial = self.breaker.state == "half-open"
+        if not self.breaker.allow():
+            self._won("fallback")
+            async for piece in ask_fallback():
+                yield piece
+            return
+
+        start = time.monotonic()
+        pumps = {"primary": StreamPump(self.primary.chat_stream(model, messages, temperature, max_tokens))}
+        firsts = {"primary": asyncio.ensure_future(pumps["primary"].next())}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(set(firsts.values()), timeout=self.hedge_delay("stream"))
+            if not done:
+                self.hedged += 1
+                metrics.LLM_RETRIES.inc(kind="hedge")
+                pumps["fallback"] = ask_fallback()
+                firsts["fallback"] = asyncio.ensure_future(pumps["fallback"].next())
+
+            # Race on the first token: whichever backend produces one (or cleanly ends) first is committed to
+            error: BaseException | None = None
+            first = None
+            while winner is None:
+                pending = [t for t in firsts.values() if not t.done()]
+                finished = [name for name, t in firsts.items() if t.done()]
+                for name in finished:
+                    task = firsts.pop(name)
+                    try:
+                        first = task.result()
+                    except StopAsyncIteration:
+                        first = None
+                    except Exception as e:
+                        error = e
+                        if name == "primary":
+                            self._primary_failed("stream", e)
+                            if "fallback" not in pumps:
+                                self.failovers += 1
+                                metrics.LLM_RETRIES.inc(kind="failover")
+                                pumps["fallback"] = ask_fallback()
+                                firsts["fallback"] = asyncio.ensure_future(pumps["fallback"].next())
+                        continue
+                    winner = name
+                    break
+                if winner is None:
+                    if not firsts:
+                        raise error
+                    await asyncio.wait(set(firsts.values()), return_when=asyncio.FIRST_COMPLETED)
+
+            if winner == "primary" or "primary" in firsts:
+                # Time to Groq's first token, or a lower bound of it when Ollama won the race
+                self._latencies["stream"].append(time.monotonic() - start)
+            self._won(winner)
+            for name, pump in pumps.items():
+                if name != winner:
+                    pump.cancel()
+            for task in firsts.values():
+                task.cancel()
+
+            if first is None:
+                return
+            yield first
+            try:
+                async for piece in pumps[winner]:
+                    yield piece
+            except Exception as e:
+                if winner == "primary":
+                    self._primary_failed("stream", e)
+                raise
+            if winner == "primary":
+                self.breaker.record_success()
+        finally:
+            for pump in pumps.values():
+                pump.cancel()
+            for task in firsts.values():
+                task.cancel()
+            if trial and self.breaker.trial_running:
+                self.breaker.abandon_trial()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "failovers": self.failovers,
+            "wins": dict(self.wins),
+            "hedge_delay_ms": {k: (d * 1000 if d is not None else None) for k, d in
+                               (("chat", self.hedge_delay("chat")), ("stream", self.hedge_delay("stream")))},
+            "breaker": {"state": self.breaker.state, "consecutive_failures": self.breaker.consecutive,
+                        "trips": self.breaker.trips},
+        }
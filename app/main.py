@@ -1,32 +1,81 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 
-from app.bart_guard import BartGuard, REFUSAL
-# from app.ollama_client import OllamaClient
-from app.groq_client import GroqClient
+from app.admission import AdmissionController
+from app.bart_guard import REFUSAL
+from app.components import Components
+from app.context_worker import ContextUpdater
+from app.guard_bulk import aiter_lines, classify_lines_async
+from app.guard_cache import normalize_text
+# from app.ollama_client import AsyncOllamaClient
+from app.http_pool import close_shared_async_client
+from app import metrics, speculation
 from app.prompts import SYSTEM_PROMPT
-from app.session_manager import SessionStore
+from app.request_log import configure_logging, log_request, new_request_id, request_id_var
+from app.response_cache import ResponseCache
+from app.session_backends import build_session_backend
+from app.session_manager import NO_CONTEXT, SessionStore
 
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PACE")
 
-guard = BartGuard()
-# ollama = OllamaClient()
-groq = GroqClient()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the guard model and LLM client in the background; /readyz flips once they are usable
+    components.start()
+    yield
+    await components.stop()
+    await context_updater.stop()
+    session_store.backend.close()
+    await close_shared_async_client()
+
+
+app = FastAPI(title="PACE", lifespan=lifespan)
+
+# ollama = AsyncOllamaClient()
 
 # LLAMA_MODEL = os.getenv("LLAMA_MODEL", "llama3.1:latest")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
-session_store = SessionStore(groq, GROQ_MODEL)
+# The LLM client is attached by Components once it has been built
+session_store = SessionStore(None, GROQ_MODEL, backend=build_session_backend())
+context_updater = ContextUpdater(session_store)
+components = Components(session_store)
+response_cache = ResponseCache()
+admission = AdmissionController()
+# Bulk screening gets its own small cap, so a few large uploads cannot take the chat slots
+bulk_admission = AdmissionController(
+    max_concurrency=int(os.getenv("GUARD_BULK_MAX_CONCURRENCY", "2")),
+    max_queue=int(os.getenv("GUARD_BULK_MAX_QUEUE", "0")),
+)
+metrics.SESSIONS.set_function(lambda: len(session_store.sessions))
+metrics.SESSION_BYTES.set_function(lambda: session_store.estimated_bytes)
+metrics.ADMISSION_ACTIVE.set_function(lambda: admission.active)
+metrics.ADMISSION_WAITING.set_function(lambda: admission.waiting)
+metrics.CONTEXT_QUEUE.set_function(lambda: context_updater.stats()["queue_depth"])
 WEB_DIR = Path(__file__).resolve().parent.parent / "web"
 
+EMPTY_SITUATION_REPLY = "Please describe the situation you observe (one or two sentences is enough)."
+LLM_ERROR_REPLY = "There has been an error, try again in a while!"
+COACH_TEMPERATURE = 0.25
+COACH_MAX_TOKENS = 180
+# Start the LLM call alongside the guard; a refused message's generation is discarded unseen
+SPECULATIVE_LLM = speculation.speculation_enabled()
+
 
 class ChatRequest(BaseModel):
     situation: str
@@ -40,6 +89,18 @@ class ChatResponse(BaseModel):
     guard_confidence: float
 
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    request_id = new_request_id(request.headers.get("x-request-id"))
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 @app.get("/", response_class=HTMLResponse)
 def home():
     return FileResponse(WEB_DIR / "index.html")
@@ -50,20 +111,230 @@ def app_js():
     return FileResponse(WEB_DIR / "app.js")
 
 
+@app.get("/healthz")
+def healthz():
+    # Liveness only: the process is up and serving, even while models are still loading
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    status = components.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "guard": components.guard.stats() if components.guard else None,
+        "context_jobs": context_updater.stats(),
+        "sessions": session_store.stats(),
+        "responses": response_cache.stats(),
+        "admission": admission.stats(),
+        "bulk_admission": bulk_admission.stats(),
+        "speculation": speculation.speculation_stats(),
+        # Hedging / failover counters when LLM_FALLBACK=ollama
+        "llm": components.llm.stats() if hasattr(components.llm, "stats") else None,
+    }
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body is produced while the request body is still being read.
+    The stock class listens for disconnect on `receive` (ASGI < 2.4), which would swallow the request
+    body chunks; here only the body iterator calls `receive`, and a disconnect ends request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/guard/batch")
+async def guard_batch(request: Request, field: str | None = None, id_field: str = "id", scores: bool = False):
+    """
+    Bulk screening: the body is JSONL (one object or string per line), the response is JSONL with one
+    verdict per input line, in order. Both are streamed, so the input can be larger than memory.
+    """
+    await components.wait_ready()
+    # 429 with Retry-After when GUARD_BULK_MAX_CONCURRENCY uploads are already running
+    await bulk_admission.acquire()
+    admitted = True
+
+    def release():
+        nonlocal admitted
+        if admitted:
+            admitted = False
+            bulk_admission.release()
+
+    results = classify_lines_async(components.guard, aiter_lines(request.stream()),
+                                   field=field, id_field=id_field, scores=scores)
+
+    async def body():
+        try:
+            async for result in results:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            release()
+
+    return DuplexStreamingResponse(body(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+
+def build_messages(situation: str, derived_context: str) -> list:
+    # Keep the user prompt short to reduce latency.
+    user_payload = f"""
+    Parent situation:
+    {situation}
+
+    Write a supportive response the parent can read and use.
+    """
+
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT.format(derived_context=derived_context)},
+        {"role": "user", "content": user_payload},
+    ]
+
+
+def first_turn_cache_key(situation: str, derived_context: str, messages: list) -> str | None:
+    # With no derived context the reply depends only on the situation and the rendered system prompt
+    if not response_cache.enabled or derived_context != NO_CONTEXT:
+        return None
+    return response_cache.key(situation, messages[0]["content"], GROQ_MODEL, COACH_TEMPERATURE)
+
+
+def record_guard(seconds: float, refuse: bool, res):
+    metrics.GUARD_SECONDS.observe(seconds)
+    metrics.GUARD_DECISIONS.inc(guard_label=res.label, refused=str(refuse).lower())
+    logger.debug("guard label=%s confidence=%.2f refused=%s", res.label, res.confidence, refuse)
+
+
+def record_request(endpoint: str, request_id: str, session_id: str, outcome: str, total_s: float, timings: dict,
+                   guard_label: str | None = None):
+    metrics.REQUEST_SECONDS.observe(total_s, endpoint=endpoint, outcome=outcome)
+    log_request(
+        request_id,
+        endpoint=endpoint,
+        session_id=session_id,
+        outcome=outcome,
+        guard_label=guard_label,
+        total_ms=round(total_s * 1000, 1),
+        **{f"{stage}_ms": round(seconds * 1000, 1) for stage, seconds in timings.items()},
+    )
+
+
+def outcome_of(resp: "ChatResponse") -> str:
+    if resp.refused:
+        return "refused"
+    if resp.response == LLM_ERROR_REPLY:
+        return "llm_error"
+    if resp.response == EMPTY_SITUATION_REPLY:
+        return "empty"
+    return "ok"
+
+
+async def prepare_reply(session_id: str, situation: str):
+    """Prompt messages, response-cache key and cached reply (if any). Reads the session, never writes it."""
+    # Read-only: with SPECULATIVE_LLM this runs before the guard verdict, and a refused message must not
+    # create a session or evict another one
+    derived_context = await session_store.prompt_context(session_id, create=False)
+    messages = build_messages(situation, derived_context)
+    cache_key = first_turn_cache_key(situation, derived_context, messages)
+    cached = response_cache.get(cache_key) if cache_key else None
+    return messages, cache_key, cached
+
+
+async def commit_turn(session_id: str, situation: str, reply: str):
+    """Save both sides of an exchange (callers shield it, so a disconnect can't store only half)."""
+    await session_store.add_message(session_id, "user", situation)
+    await session_store.add_message(session_id, "assistant", reply)
+    # Context distillation is a second LLM round trip; run it in the background, and only every few turns
+    if session_store.needs_context_update(session_id):
+        context_updater.schedule(session_id)
+
+
+# Your OllamaClient should put temperature/num_predict inside "options".
+# ollama.chat(model=LLAMA_MODEL, messages=messages, temperature=0.25, num_predict=180)
+def generate(messages: list):
+    return components.llm.chat(
+        model=GROQ_MODEL,
+        messages=messages,
+        temperature=COACH_TEMPERATURE,
+        max_tokens=COACH_MAX_TOKENS,
+    )
+
+
+# async for piece in ollama.chat_stream(model=LLAMA_MODEL, messages=messages, num_predict=180):
+def generate_stream(messages: list):
+    return components.llm.chat_stream(
+        model=GROQ_MODEL,
+        messages=messages,
+        temperature=COACH_TEMPERATURE,
+        max_tokens=COACH_MAX_TOKENS,
+    )
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
+    timings = {}
+    start = time.perf_counter()
+    situation = (req.situation or "").strip()
+    if situation:
+        # Startup waits happen before admission, so they don't hold slots
+        await components.wait_ready()
+        key = (req.session_id, normalize_text(situation))
+        resp = await admission.run(key, lambda: handle_chat(req, timings))
+    else:
+        resp = await handle_chat(req, timings)
+    record_request("chat", request_id_var.get(), req.session_id, outcome_of(resp), time.perf_counter() - start,
+                   timings, resp.guard_label)
+    return resp
+
+
+async def handle_chat(req: ChatRequest, timings: dict | None = None) -> ChatResponse:
+    """Body of /chat. If `timings` is given, it is filled with per-stage wall time in seconds (ready, guard, llm)."""
+    timings = timings if timings is not None else {}
     situation = (req.situation or "").strip()
     if not situation:
         return ChatResponse(
-            response="Please describe the situation you observe (one or two sentences is enough).",
+            response=EMPTY_SITUATION_REPLY,
             refused=False,
             guard_label="IN_DOMAIN_COACHING",
             guard_confidence=1.0,
         )
 
-    refuse, res = guard.should_refuse(situation)
-    print(f"DEBUG GUARD: situation='{situation}' label='{res.label}' confidence={res.confidence:.2f}")
+    start = time.perf_counter()
+    await components.wait_ready()
+    timings["ready"] = time.perf_counter() - start
+
+    speculative = None
+    if SPECULATIVE_LLM:
+        messages, cache_key, output = await prepare_reply(req.session_id, situation)
+        if output is None:
+            llm_start = time.perf_counter()
+            speculative = asyncio.ensure_future(generate(messages))
+
+    start = time.perf_counter()
+    try:
+        refuse, res = await components.guard.should_refuse_async(situation)
+    except BaseException:
+        if speculative is not None:
+            speculative.cancel()
+        raise
+    timings["guard"] = time.perf_counter() - start
+    record_guard(timings["guard"], refuse, res)
     if refuse:
+        if speculative is not None:
+            speculation.discard(speculative)
         return ChatResponse(
             response=REFUSAL,
             refused=True,
@@ -72,46 +343,30 @@ def chat(req: ChatRequest):
         )
 
     # Get session context
-    session = session_store.get_session(req.session_id)
-    derived_context = session.derived_context
+    if not SPECULATIVE_LLM:
+        messages, cache_key, output = await prepare_reply(req.session_id, situation)
 
-    # Keep the user prompt short to reduce latency.
-    user_payload = f"""
-    Parent situation:
-    {situation}
+    if output is None:
+        start = time.perf_counter()
+        try:
+            if speculative is not None:
+                speculation.used()
+                output = await speculative
+            else:
+                llm_start = start
+                output = await generate(messages)
+            if cache_key and output.strip():
+                response_cache.put(cache_key, output.strip(), time.perf_counter() - llm_start)
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(kind="chat")
+            logger.warning("Groq error: %r", e)
+            output = LLM_ERROR_REPLY
+        timings["llm"] = time.perf_counter() - start
+        metrics.LLM_SECONDS.observe(timings["llm"], endpoint="chat")
+    else:
+        timings["llm"] = 0.0
 
-    Write a supportive response the parent can read and use.
-    """
-
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT.format(derived_context=derived_context)},
-        {"role": "user", "content": user_payload},
-    ]
-
-    # Your OllamaClient should put temperature/num_predict inside "options".
-    try:
-        # output = ollama.chat(
-        #     model=LLAMA_MODEL,
-        #     messages=messages,
-        #     temperature=0.25,
-        #     num_predict=180,   # prevents long generations + timeouts
-        # )
-        output = groq.chat(
-            model=GROQ_MODEL,
-            messages=messages,
-            temperature=0.25,
-            max_tokens=180,
-        )
-    except Exception as e:
-        # print("OLLAMA ERROR:", repr(e))
-        print("GROQ ERROR:", repr(e))
-        output = (
-            "There has been an error, try again in a while!"
-        )
-
-    session_store.add_message(req.session_id, "user", situation)
-    session_store.add_message(req.session_id, "assistant", output.strip())
-    session_store.update_derived_context(req.session_id)
+    await asyncio.shield(commit_turn(req.session_id, situation, output.strip()))
 
     return ChatResponse(
         response=output.strip(),
@@ -121,6 +376,125 @@ def chat(req: ChatRequest):
     )
 
 
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-sent events version of /chat: a `meta` event with the guard verdict, then `token` events
+    as the LLM produces text, then `done` with the full response once it is committed to the session,
+    or `error` if the LLM stream fails (nothing is committed then).
+    """
+    situation = (req.situation or "").strip()
+    request_id = request_id_var.get()
+    request_start = time.perf_counter()
+    timings = {}
+    admitted = False
+    if situation:
+        await components.wait_ready()
+        timings["ready"] = time.perf_counter() - request_start
+        # Taken before the response starts, so an overloaded server can still answer 429/503;
+        # held until the stream ends
+        await admission.acquire()
+        admitted = True
+
+    def release():
+        nonlocal admitted
+        if admitted:
+            admitted = False
+            admission.release()
+
+    def finish(outcome: str, guard_label: str | None = None):
+        record_request("chat_stream", request_id, req.session_id, outcome, time.perf_counter() - request_start,
+                       timings, guard_label)
+
+    async def events():
+        try:
+            async for event in stream():
+                yield event
+        finally:
+            release()
+
+    async def stream():
+        if not situation:
+            yield sse("meta", {"refused": False, "guard_label": "IN_DOMAIN_COACHING", "guard_confidence": 1.0})
+            yield sse("token", {"text": EMPTY_SITUATION_REPLY})
+            yield sse("done", {"response": EMPTY_SITUATION_REPLY})
+            finish("empty")
+            return
+
+        pump = None
+        if SPECULATIVE_LLM:
+            messages, cache_key, cached = await prepare_reply(req.session_id, situation)
+            if cached is None:
+                llm_start = time.perf_counter()
+                # Tokens are buffered, and only sent once the guard has allowed the message
+                pump = speculation.StreamPump(generate_stream(messages))
+        try:
+            start = time.perf_counter()
+            refuse, res = await components.guard.should_refuse_async(situation)
+            timings["guard"] = time.perf_counter() - start
+            record_guard(timings["guard"], refuse, res)
+            yield sse("meta", {"refused": refuse, "guard_label": res.label, "guard_confidence": res.confidence})
+            if refuse:
+                if pump is not None:
+                    speculation.discard(pump.task)
+                yield sse("token", {"text": REFUSAL})
+                yield sse("done", {"response": REFUSAL})
+                finish("refused", res.label)
+                return
+
+            if not SPECULATIVE_LLM:
+                messages, cache_key, cached = await prepare_reply(req.session_id, situation)
+
+            parts = []
+            if cached is not None:
+                parts.append(cached)
+                yield sse("token", {"text": cached})
+            else:
+                start = time.perf_counter()
+                try:
+                    if pump is not None:
+                        speculation.used()
+                        pieces = pump
+                    else:
+                        llm_start = start
+                        pieces = generate_stream(messages)
+                    async for piece in pieces:
+                        parts.append(piece)
+                        yield sse("token", {"text": piece})
+                    if cache_key and parts:
+                        response_cache.put(cache_key, "".join(parts).strip(), time.perf_counter() - llm_start)
+                except Exception as e:
+                    metrics.LLM_ERRORS.inc(kind="stream")
+                    logger.warning("Groq error: %r", e)
+                    timings["llm"] = time.perf_counter() - start
+                    metrics.LLM_SECONDS.observe(timings["llm"], endpoint="chat_stream")
+                    # A partial reply is neither saved to the session nor cached; the client shows the error
+                    yield sse("error", {"detail": LLM_ERROR_REPLY})
+                    finish("llm_error", res.label)
+                    return
+                timings["llm"] = time.perf_counter() - start
+                metrics.LLM_SECONDS.observe(timings["llm"], endpoint="chat_stream")
+        finally:
+            # Guard error or client disconnect: don't leave a speculative generation running
+            if pump is not None and not pump.task.done():
+                pump.task.cancel()
+
+        # Only a completed generation reaches the session; an LLM error returns above and a client
+        # disconnect cancels this generator
+        output = "".join(parts).strip()
+        await asyncio.shield(commit_turn(req.session_id, situation, output))
+        yield sse("done", {"response": output})
+        finish("ok", res.label)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also releases the slot if the client went away before the stream started
+        background=BackgroundTask(release),
+    )
+
+
 def run():
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
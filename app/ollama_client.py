@@ -1,15 +1,20 @@
+import json
 import os
+from typing import AsyncIterator
+
+import httpx
 import requests
 
+from app.http_pool import shared_async_client, sync_timeout
 
-class OllamaClient:
-    def __init__(self, base_url: str | None = None, timeout: int = 600):
-        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-        self.timeout = timeout
 
-    def chat(self, model: str, messages: list, temperature: float = 0.25, num_predict: int = 180):
+class _OllamaBase:
+    def __init__(self, base_url: str | None = None):
+        self.base_url = (base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")).rstrip("/")
+
+    def _request(self, model: str, messages: list, temperature: float, num_predict: int, stream: bool = False):
         """
-        Calls Ollama /api/chat using the correct REST payload.
+        Builds the Ollama /api/chat REST payload.
         - temperature + num_predict must be inside options for Ollama
         """
         url = f"{self.base_url}/api/chat"
@@ -17,7 +22,7 @@ class OllamaClient:
         payload = {
             "model": model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
             "options": {
                 "temperature": temperature,
                 "num_predict": num_predict,
@@ -25,10 +30,55 @@ class OllamaClient:
                 "repeat_penalty": 1.1,
             },
         }
+        return url, payload
+
 
-        resp = requests.post(url, json=payload, timeout=self.timeout)
+class OllamaClient(_OllamaBase):
+    def __init__(self, base_url: str | None = None, timeout=None):
+        super().__init__(base_url)
+        self.timeout = timeout if timeout is not None else sync_timeout()
+        # Keep-alive session so repeated calls reuse the connection
+        self.session = requests.Session()
+
+    def chat(self, model: str, messages: list, temperature: float = 0.25, num_predict: int = 180):
+        url, payload = self._request(model, messages, temperature, num_predict)
+        resp = self.session.post(url, json=payload, timeout=self.timeout)
         resp.raise_for_status()
         data = resp.json()
 
         # Ollama returns: { "message": { "role": "...", "content": "..." }, ... }
-        return data["message"]["content"]
\ No newline at end of file
+        return data["message"]["content"]
+
+
+class AsyncOllamaClient(_OllamaBase):
+    """Async Ollama client on the shared pooled httpx connection (see app/http_pool.py)."""
+
+    def __init__(self, base_url: str | None = None, client: httpx.AsyncClient | None = None):
+        super().__init__(base_url)
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or shared_async_client()
+
+    async def chat(self, model: str, messages: list, temperature: float = 0.25, num_predict: int = 180):
+        url, payload = self._request(model, messages, temperature, num_predict)
+        resp = await self.client.post(url, json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["message"]["content"]
+
+    async def chat_stream(self, model: str, messages: list, temperature: float = 0.25, num_predict: int = 180) -> AsyncIterator[str]:
+        """Yields content pieces as Ollama produces them (one JSON object per line)."""
+        url, payload = self._request(model, messages, temperature, num_predict, stream=True)
+        async with self.client.stream("POST", url, json=payload) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                piece = data.get("message", {}).get("content")
+                if piece:
+                    yield piece
+                if data.get("done"):
+                    break
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import uuid
+from contextvars import ContextVar
+
+# Set per HTTP request by the middleware in app.main; "-" outside a request (startup, background jobs)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+logger = logging.getLogger("app.requests")
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` to every record so log lines from one request can be correlated."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def new_request_id(header_value: str | None) -> str:
+    # Honour an upstream ID (load balancer, client) so traces line up across services
+    return header_value or uuid.uuid4().hex
+
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    root = logging.getLogger("app")
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.handlers = [handler]
+    root.propagate = False
+
+
+def request_log_enabled() -> bool:
+    return os.getenv("REQUEST_LOG", "0").lower() in ("1", "true", "yes")
+
+
+def log_request(request_id: str, **fields):
+    """One JSON line per chat request (REQUEST_LOG=1): outcome, guard verdict and per-stage milliseconds."""
+    if not request_log_enabled():
+        return
+    logger.info(json.dumps({"request_id": request_id, **fields}, default=str))
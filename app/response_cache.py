@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.guard_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Cache of LLM replies for first-turn requests (no derived context yet), where the reply depends only
+    on the situation, the rendered system prompt, the model and the temperature.
+    In-memory LRU with optional TTL, backed by an optional on-disk tier (one JSON file per key) that
+    survives restarts and is shared by workers on the same host.
+    """
+
+    def __init__(self, max_size: int | None = None, ttl: float | None = None, cache_dir: str | None = None):
+        # 0 disables the cache (the default: enabling it makes repeated first messages get identical replies)
+        self.max_size = int(max_size if max_size is not None else os.getenv("RESPONSE_CACHE_SIZE", "0"))
+        # 0 means entries never expire
+        self.ttl = float(ttl if ttl is not None else os.getenv("RESPONSE_CACHE_TTL", "86400"))
+        cache_dir = cache_dir if cache_dir is not None else os.getenv("RESPONSE_CACHE_DIR", "")
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.enabled and self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # key -> (stored_at wall time, response, generation latency in seconds)
+        self._entries: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_latency = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def key(situation: str, system_prompt: str, model: str, temperature: float) -> str:
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        raw = "\x00".join([model, repr(float(temperature)), prompt_hash, normalize_text(situation)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.time() - stored_at > self.ttl
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str, float]]:
+        try:
+            data = json.loads(self._disk_path(key).read_text(encoding="utf-8"))
+            return data["stored_at"], data["response"], data["latency_s"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, entry: Tuple[float, str, float]):
+        path = self._disk_path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            tmp.write_text(json.dumps({"stored_at": entry[0], "response": entry[1], "latency_s": entry[2]}),
+                           encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Error writing response cache entry %s: %r", path, e)
+
+    def _store(self, key: str, entry: Tuple[float, str, float]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self._entries[key]
+                entry = None
+            if entry is None and self.cache_dir is not None:
+                entry = self._read_disk(key)
+                if entry is not None and self._expired(entry[0]):
+                    entry = None
+                if entry is not None:
+                    self.disk_hits += 1
+                    self._store(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_latency += entry[2]
+            return entry[1]
+
+    def put(self, key: str, response: str, latency_s: float):
+        if not self.enabled:
+            return
+        entry = (time.time(), response, latency_s)
+        with self._lock:
+            self._store(key, entry)
+        if self.cache_dir is not None:
+            self._write_disk(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            # Sum of the original generation latencies of every reply served from the cache
+            "saved_latency_s": self.saved_latency,
+        }
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.session_manager import Session
+
+logger = logging.getLogger(__name__)
+
+
+class SessionBackend:
+    """
+    Persistence behind SessionStore. The store keeps live sessions in process memory as a read cache;
+    the backend is where they survive restarts and become visible to other workers.
+    """
+
+    # True when other processes can write the same sessions, so cached copies must be revalidated
+    shared = False
+    # True when calls may wait on I/O or locks; SessionStore then makes them from a worker thread
+    blocking = False
+
+    def load(self, session_id: str, max_messages: int) -> Optional[Tuple[dict, List[Tuple[str, str]]]]:
+        """Return (state, [(role, content), ...]) for a stored session, or None."""
+        return None
+
+    def watermarks(self, session_id: str) -> Tuple[int, int]:
+        """(message_count, distilled_upto) as stored, including queued writes; (0, 0) for an unknown session."""
+        return 0, 0
+
+    def append_message(self, session_id: str, role: str, content: str):
+        pass
+
+    def save_state(self, session: "Session"):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(SessionBackend):
+    """Sessions live only in process memory (single worker, lost on restart)."""
+
+
+class SqliteBackend(SessionBackend):
+    """
+    SQLite in WAL mode, so several uvicorn workers can read while one writes.
+    Writes are write-behind: appends and context updates are queued and committed in batches by a
+    flusher thread every SESSION_FLUSH_MS, or as soon as SESSION_FLUSH_BATCH operations are pending.
+    Reads do not flush; they overlay this process's queued writes on what the database returns.
+    Each flush also applies the store's limits to the database: sessions it wrote keep only their last
+    SESSION_MAX_MESSAGES messages, and sessions idle for SESSION_IDLE_TTL or beyond the SESSION_MAX_COUNT
+    most recently active are deleted.
+    """
+
+    shared = True
+    blocking = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        derived_context TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        distilled_upto INTEGER NOT NULL DEFAULT 0,
+        last_accessed REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+    CREATE INDEX IF NOT EXISTS idx_sessions_accessed ON sessions(last_accessed);
+    """
+
+    def __init__(self, path: str | None = None, flush_ms: float | None = None, flush_batch: int | None = None,
+                 max_messages: int | None = None, max_sessions: int | None = None, idle_ttl: float | None = None):
+        self.path = path or os.getenv("SESSION_DB_PATH", "data/sessions.db")
+        self.flush_interval = float(flush_ms if flush_ms is not None else os.getenv("SESSION_FLUSH_MS", "200")) / 1000.0
+        self.flush_batch = int(flush_batch if flush_batch is not None else os.getenv("SESSION_FLUSH_BATCH", "64"))
+        # Same limits (and settings) as SessionStore, applied to what is stored
+        self.max_messages = int(max_messages if max_messages is not None else os.getenv("SESSION_MAX_MESSAGES", "20"))
+        self.max_sessions = int(max_sessions if max_sessions is not None else os.getenv("SESSION_MAX_COUNT", "10000"))
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None else os.getenv("SESSION_IDLE_TTL", "3600"))
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(self.SCHEMA)
+        self._db_lock = threading.Lock()
+
+        self._messages: List[Tuple[str, str, str, float]] = []
+        self._states: Dict[str, Tuple[str, int, float]] = {}  # latest context update per session
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.flushes = 0
+        self.deleted = 0
+        self._flusher = threading.Thread(target=self._run, name="session-flusher", daemon=True)
+        self._flusher.start()
+
+    def load(self, session_id: str, max_messages: int):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT derived_context, message_count, distilled_upto, last_accessed FROM sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            messages = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, max_messages),
+            ).fetchall() if row is not None else []
+            pending, update = self._pending_for(session_id)
+        if row is None and not pending and update is None:
+            return None
+        state = {"derived_context": None, "message_count": 0, "distilled_upto": 0, "last_accessed": 0.0}
+        if row is not None:
+            state = {"derived_context": row[0], "message_count": row[1], "distilled_upto": row[2], "last_accessed": row[3]}
+        messages = list(reversed(messages))
+        # Our own queued writes are overlaid, not flushed: a read never waits for the write lock
+        for role, content, ts in pending:
+            messages.append((role, content))
+            state["message_count"] += 1
+            state["last_accessed"] = ts
+        if update is not None:
+            state["derived_context"], state["distilled_upto"] = update[0], update[1]
+        return state, messages[-max_messages:] if max_messages > 0 else []
+
+    def watermarks(self, session_id: str) -> Tuple[int, int]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT message_count, distilled_upto FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            pending, update = self._pending_for(session_id)
+        count, distilled_upto = row if row is not None else (0, 0)
+        return count + len(pending), update[1] if update is not None else distilled_upto
+
+    def _pending_for(self, session_id: str):
+        """Queued messages and context update of one session. Called under _db_lock, so no flush is
+        half-way: every write is either committed or still queued."""
+        with self._pending_lock:
+            pending = [(role, content, ts) for sid, role, content, ts in self._messages if sid == session_id]
+            return pending, self._states.get(session_id)
+
+    def append_message(self, session_id: str, role: str, content: str):
+        with self._pending_lock:
+            self._messages.append((session_id, role, content, time.time()))
+            if len(self._messages) + len(self._states) >= self.flush_batch:
+                self._wake.set()
+
+    def save_state(self, session: "Session"):
+        with self._pending_lock:
+            self._states[session.session_id] = (session.derived_context, session.distilled_upto, session.last_accessed)
+            if len(self._messages) + len(self._states) >= self.flush_batch:
+                self._wake.set()
+
+    def flush(self):
+        with self._db_lock:
+            # Taken under _db_lock, so readers see these writes either queued or committed
+            with self._pending_lock:
+                messages, self._messages = self._messages, []
+                states, self._states = self._states, {}
+            if not messages and not states:
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for session_id, role, content, ts in messages:
+                    self._conn.execute(
+                        "INSERT INTO sessions (session_id, message_count, last_accessed) VALUES (?, 1, ?) "
+                        "ON CONFLICT(session_id) DO UPDATE SET message_count = message_count + 1, last_accessed = excluded.last_accessed",
+                        (session_id, ts),
+                    )
+                    self._conn.execute(
+                        "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                        (session_id, role, content),
+                    )
+                for session_id, (context, distilled_upto, ts) in states.items():
+                    self._conn.execute(
+                        "INSERT INTO sessions (session_id, derived_context, distilled_upto, last_accessed) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(session_id) DO UPDATE SET derived_context = excluded.derived_context, "
+                        "distilled_upto = excluded.distilled_upto",
+                        (session_id, context, distilled_upto, ts),
+                    )
+                self._trim({session_id for session_id, _, _, _ in messages})
+                deleted = self._expire()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                # Put the batch back so the next flush retries it
+                with self._pending_lock:
+                    self._messages[:0] = messages
+                    for session_id, state in states.items():
+                        self._states.setdefault(session_id, state)
+                raise
+        self.flushes += 1
+        self.deleted += deleted
+
+    def _trim(self, session_ids):
+        """Keep only the last max_messages messages of the sessions that just got new ones."""
+        for session_id in session_ids:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id <= "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, self.max_messages),
+            )
+
+    def _expire(self) -> int:
+        """Delete idle sessions and those beyond max_sessions, least recently active first."""
+        expired = []
+        keep = "1"
+        params: tuple = ()
+        if self.idle_ttl > 0:
+            params = (time.time() - self.idle_ttl,)
+            expired += self._conn.execute("SELECT session_id FROM sessions WHERE last_accessed < ?", params).fetchall()
+            keep = "last_accessed >= ?"
+        excess = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - len(expired) - self.max_sessions
+        if excess > 0:
+            expired += self._conn.execute(
+                f"SELECT session_id FROM sessions WHERE {keep} ORDER BY last_accessed LIMIT ?", params + (excess,)
+            ).fetchall()
+        if expired:
+            self._conn.executemany("DELETE FROM messages WHERE session_id = ?", expired)
+            self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", expired)
+        return len(expired)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing sessions to %s: %r", self.path, e)
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+
+def build_session_backend(kind: str | None = None) -> SessionBackend:
+    kind = kind or os.getenv("SESSION_BACKEND", "memory")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SqliteBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND '{kind}' (expected memory or sqlite)")
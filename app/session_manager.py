@@ -1,38 +1,209 @@
+import asyncio
+import logging
+import os
 import time
-from typing import Dict, List, Optional
-from app.groq_client import GroqClient
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional
+from app.groq_client import AsyncGroqClient
+from app.session_backends import MemoryBackend, SessionBackend
+from app import metrics
 from app.prompts import CONTEXT_DERIVATION_PROMPT
 
+logger = logging.getLogger(__name__)
+
+NO_CONTEXT = "No previous context."
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; good enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[: max_tokens * 4]
+    # Prefer ending on a whole bullet/line, then on a word
+    for sep in ("\n", " "):
+        idx = cut.rfind(sep)
+        if idx > len(cut) // 2:
+            return cut[:idx].rstrip()
+    return cut.rstrip()
+
+
+# Rough per-object overheads (CPython) used for the store's memory estimate
+MESSAGE_OVERHEAD_BYTES = 120
+SESSION_OVERHEAD_BYTES = 700
+
+
+class Message:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+
 class Session:
-    def __init__(self, session_id: str):
+    __slots__ = ("session_id", "messages", "derived_context", "last_accessed", "message_count", "distilled_upto")
+
+    def __init__(self, session_id: str, max_messages: int = 20):
         self.session_id = session_id
-        self.messages: List[Dict[str, str]] = []
-        self.derived_context: str = "No previous context."
+        # Ring buffer: appending past maxlen drops the oldest message without re-slicing
+        self.messages: Deque[Message] = deque(maxlen=max_messages)
+        self.derived_context: str = NO_CONTEXT
         self.last_accessed = time.time()
+        # Total messages ever added, and how many of them are already folded into derived_context
+        self.message_count = 0
+        self.distilled_upto = 0
+
+    def estimated_bytes(self) -> int:
+        size = SESSION_OVERHEAD_BYTES + len(self.session_id) + len(self.derived_context)
+        for msg in self.messages:
+            size += MESSAGE_OVERHEAD_BYTES + len(msg.content)
+        return size
 
 class SessionStore:
-    def __init__(self, groq_client: GroqClient, model: str):
-        self.sessions: Dict[str, Session] = {}
+    def __init__(self, groq_client: Optional[AsyncGroqClient], model: str, update_every_turns: int | None = None,
+                 unsummarized_token_budget: int | None = None, max_context_tokens: int | None = None,
+                 max_sessions: int | None = None, idle_ttl: float | None = None, max_messages: int | None = None,
+                 backend: SessionBackend | None = None):
+        # Kept in least-recently-accessed-first order, so eviction only ever looks at the front
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
         self.groq = groq_client
         self.model = model
+        # Distil every N parent turns, or earlier once the undistilled messages exceed the token budget
+        self.update_every_turns = int(update_every_turns if update_every_turns is not None else os.getenv("CONTEXT_UPDATE_EVERY_TURNS", "2"))
+        self.unsummarized_token_budget = int(unsummarized_token_budget if unsummarized_token_budget is not None else os.getenv("CONTEXT_UNSUMMARIZED_TOKENS", "400"))
+        self.max_context_tokens = int(max_context_tokens if max_context_tokens is not None else os.getenv("CONTEXT_MAX_TOKENS", "150"))
+        self.max_sessions = int(max_sessions if max_sessions is not None else os.getenv("SESSION_MAX_COUNT", "10000"))
+        # Seconds without access before a session is dropped; 0 disables idle eviction
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None else os.getenv("SESSION_IDLE_TTL", "3600"))
+        self.max_messages = int(max_messages if max_messages is not None else os.getenv("SESSION_MAX_MESSAGES", "20"))
+        self.backend = backend or MemoryBackend()
+        self.estimated_bytes = 0
+        self.evicted = 0
 
-    def get_session(self, session_id: str) -> Session:
-        if session_id not in self.sessions:
-            self.sessions[session_id] = Session(session_id)
-        session = self.sessions[session_id]
+    async def _backend(self, fn, *args):
+        """Call the backend, from a worker thread if it can block (a locked SQLite file must not stall the loop)."""
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def _fresh(self, session_id: str) -> Optional[Session]:
+        """The cached session, unless another worker has written it since: its watermarks differ from the backend's."""
+        session = self.sessions.get(session_id)
+        if session is not None and self.backend.shared:
+            stored = await self._backend(self.backend.watermarks, session_id)
+            if stored != (session.message_count, session.distilled_upto):
+                return None
+        return session
+
+    async def get_session(self, session_id: str) -> Session:
+        session = await self._fresh(session_id)
+        if session is None:
+            loaded = await self._backend(self._load, session_id)
+            # Another request may have (re)loaded it while we were waiting
+            session = self.sessions.get(session_id)
+            if session is None or (session.message_count, session.distilled_upto) != (loaded.message_count, loaded.distilled_upto):
+                if session is not None:
+                    self._drop(session_id)
+                session = loaded
+                self.sessions[session_id] = session
+                self.estimated_bytes += session.estimated_bytes()
+        self.sessions.move_to_end(session_id)
         session.last_accessed = time.time()
+        self.evict()
         return session
 
-    def update_derived_context(self, session_id: str):
-        session = self.get_session(session_id)
-        if not session.messages:
+    def _load(self, session_id: str) -> Session:
+        """Read a session from the backend on first access (or start a new one)."""
+        session = Session(session_id, self.max_messages)
+        stored = self.backend.load(session_id, self.max_messages)
+        if stored is not None:
+            state, messages = stored
+            session.derived_context = state["derived_context"] or NO_CONTEXT
+            session.message_count = state["message_count"]
+            session.distilled_upto = state["distilled_upto"]
+            session.messages.extend(Message(role, content) for role, content in messages)
+        return session
+
+    def _drop(self, session_id: str):
+        session = self.sessions.pop(session_id)
+        self.estimated_bytes -= session.estimated_bytes()
+
+    def peek(self, session_id: str) -> Optional[Session]:
+        """Look up a session without creating it or counting as an access."""
+        return self.sessions.get(session_id)
+
+    def evict(self):
+        """Drop idle sessions and enforce max_sessions, oldest access first."""
+        now = time.time()
+        while self.sessions:
+            session_id, oldest = next(iter(self.sessions.items()))
+            idle = self.idle_ttl > 0 and now - oldest.last_accessed > self.idle_ttl
+            if not idle and len(self.sessions) <= self.max_sessions:
+                break
+            self._drop(session_id)
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "estimated_bytes": self.estimated_bytes,
+            "evicted": self.evicted,
+        }
+
+    def undistilled_messages(self, session: Session) -> List[Message]:
+        """Messages added after the distillation watermark (that are still in the history window)."""
+        first_kept = session.message_count - len(session.messages)
+        skip = max(0, session.distilled_upto - first_kept)
+        return list(islice(session.messages, skip, None))
+
+    def needs_context_update(self, session_id: str) -> bool:
+        session = self.peek(session_id)
+        delta = self.undistilled_messages(session) if session else []
+        if not delta:
+            return False
+        turns = sum(1 for msg in delta if msg.role == "user")
+        tokens = sum(estimate_tokens(msg.content) for msg in delta)
+        return turns >= self.update_every_turns or tokens >= self.unsummarized_token_budget
+
+    async def prompt_context(self, session_id: str, create: bool = True) -> str:
+        """
+        Derived context plus the parent's messages that have not been distilled yet.
+        create=False is a read-only lookup: a session that is not cached is read from the backend without
+        caching it (unknown ids get NO_CONTEXT), and nothing is created, reordered or evicted.
+        """
+        if create:
+            session = await self.get_session(session_id)
+        else:
+            session = await self._fresh(session_id)
+            if session is None:
+                session = await self._backend(self._load, session_id)
+        recent = [msg.content for msg in self.undistilled_messages(session) if msg.role == "user"]
+        if not recent:
+            return session.derived_context
+        lines = "\n".join(f"- {text}" for text in recent)
+        return f"{session.derived_context}\n\nNot yet summarized, parent said:\n{lines}"
+
+    async def update_derived_context(self, session_id: str):
+        session = self.peek(session_id)
+        if session is None:  # evicted while the job was queued
+            return
+        # Only send what was added since the last distillation
+        upto = session.message_count
+        delta = self.undistilled_messages(session)
+        if not delta:
             return
 
         # Prepare a history string for the LLM
         history = ""
-        for msg in session.messages[-6:]: # Look at last 6 messages
-            role = "User" if msg["role"] == "user" else "PACE"
-            history += f"{role}: {msg['content']}\n"
+        for msg in delta:
+            role = "User" if msg.role == "user" else "PACE"
+            history += f"{role}: {msg.content}\n"
 
         prompt = CONTEXT_DERIVATION_PROMPT.format(
             current_context=session.derived_context,
@@ -40,19 +211,27 @@ class SessionStore:
         )
 
         try:
-            new_context = self.groq.chat(
+            new_context = await self.groq.chat(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.1,
-                max_tokens=150
+                max_tokens=self.max_context_tokens
             )
-            session.derived_context = new_context.strip()
-        except Exception as e:
-            print(f"Error updating context for session {session_id}: {e}")
-
-    def add_message(self, session_id: str, role: str, content: str):
-        session = self.get_session(session_id)
-        session.messages.append({"role": role, "content": content})
-        # Keep history manageable
-        if len(session.messages) > 20:
-            session.messages = session.messages[-20:]
+            new_context = truncate_to_tokens(new_context.strip(), self.max_context_tokens)
+            if self.sessions.get(session_id) is session:
+                self.estimated_bytes += len(new_context) - len(session.derived_context)
+            session.derived_context = new_context
+            session.distilled_upto = upto
+            await self._backend(self.backend.save_state, session)
+        except Exception:
+            # Counted here, logged and tallied by the caller (ContextUpdater)
+            metrics.LLM_ERRORS.inc(kind="context")
+            raise
+
+    async def add_message(self, session_id: str, role: str, content: str):
+        session = await self.get_session(session_id)
+        before = session.estimated_bytes()
+        session.messages.append(Message(role, content))
+        session.message_count += 1
+        self.estimated_bytes += session.estimated_bytes() - before
+        await self._backend(self.backend.append_message, session_id, role, content)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import AsyncIterator, Dict
+
+from app import metrics
+
+_DONE = object()
+
+
+def speculation_enabled() -> bool:
+    """SPECULATIVE_LLM=1 starts the LLM call alongside the guard instead of after it."""
+    return os.getenv("SPECULATIVE_LLM", "0").lower() in ("1", "true", "yes")
+
+
+def discard(task: asyncio.Future):
+    """Throw away a speculative generation the guard refused: cancel it if running, swallow its result if not."""
+    if not task.cancel() and not task.cancelled():
+        task.exception()
+    metrics.SPECULATION.inc(result="wasted")
+
+
+def used():
+    metrics.SPECULATION.inc(result="used")
+
+
+class StreamPump:
+    """
+    Consumes an LLM token stream in a background task and buffers the pieces, so generation can start
+    before the guard verdict and be replayed to the client only once the message has been allowed.
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run(source))
+
+    async def _run(self, source: AsyncIterator[str]):
+        try:
+            async for piece in source:
+                self._queue.put_nowait(piece)
+            self._queue.put_nowait(_DONE)
+        except Exception as e:
+            self._queue.put_nowait(e)
+
+    async def next(self) -> str:
+        """The next piece; raises StopAsyncIteration at the end, or the source's exception."""
+        item = await self._queue.get()
+        if item is _DONE:
+            # Keep the end marker so later calls also stop
+            self._queue.put_nowait(_DONE)
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            self._queue.put_nowait(item)
+            raise item
+        return item
+
+    async def __aiter__(self):
+        while True:
+            try:
+                yield await self.next()
+            except StopAsyncIteration:
+                return
+
+    def cancel(self):
+        self.task.cancel()
+
+
+def speculation_stats() -> Dict[str, float]:
+    used_count = metrics.SPECULATION.value(result="used")
+    wasted = metrics.SPECULATION.value(result="wasted")
+    total = used_count + wasted
+    return {
+        "enabled": speculation_enabled(),
+        "used": used_count,
+        "wasted": wasted,
+        # Share of speculative generations the guard refused (paid for but never shown)
+        "wasted_fraction": (wasted / total) if total else 0.0,
+    }
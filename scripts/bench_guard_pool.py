@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from app.bart_guard import BartGuard
+from app.guard_pool import GuardPool, available_cores
+from bench_stages import summarize, texts_of_length
+
+
+def pss_mb(pid: int) -> float | None:
+    """Proportional set size: shared weight pages are split between the processes that map them (Linux only)."""
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def bench_pool(guard: BartGuard, replicas: int, threads: int | None, texts, rounds: int, batch_size: int) -> dict:
+    pool = GuardPool(guard, replicas=replicas, threads=threads, max_batch_size=batch_size, max_wait_ms=2)
+    try:
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(rounds):
+            # Open loop: every message of the round is in flight at once, the dispatcher spreads them
+            sent = [(time.perf_counter(), pool.submit(text)) for text in texts]
+            for t0, fut in sent:
+                fut.result()
+                latencies.append(time.perf_counter() - t0)
+        row = summarize(latencies, time.perf_counter() - start)
+        row["replicas"] = replicas
+        row["threads_per_replica"] = pool.threads
+        pss = [pss_mb(pid) for pid in pool.pids]
+        row["replica_pss_mb"] = round(sum(pss), 1) if None not in pss else None
+        return row
+    finally:
+        pool.close()
+
+
+def main():
+    cores = len(available_cores())
+    parser = argparse.ArgumentParser(description="Guard throughput as the number of model replicas grows.")
+    parser.add_argument("--replicas", type=int, nargs="*",
+                        default=sorted({n for n in (1, 2, 4, 8, 16) if n <= cores} | {cores}))
+    parser.add_argument("--threads", type=int, help="torch threads per replica (default: cores / replicas)")
+    parser.add_argument("--messages", type=int, default=128, help="messages in flight per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--words", type=int, default=20, help="words per message (parent messages are short)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("GUARD_BATCH_SIZE", "8")))
+    parser.add_argument("--out", help="write results as JSON")
+    args = parser.parse_args()
+
+    print(f"Loading guard once; each pool shares its weights with the replicas ({cores} cores)...")
+    guard = BartGuard()
+    # Measure the model, not the parent's cache or cascade shortcuts
+    guard.cache.max_size = 0
+    guard.cascade = None
+    texts = texts_of_length(args.words, args.messages)
+
+    rows = []
+    for replicas in args.replicas:
+        print(f"  replicas={replicas}")
+        rows.append(bench_pool(guard, replicas, args.threads, texts, args.rounds, args.batch_size))
+
+    base = rows[0]["throughput_per_s"]
+    print(f"\n{'Replicas':>8} | {'Threads':>7} | {'msg/s':>8} | {'Speedup':>7} | {'p50 ms':>8} | {'p95 ms':>8} | {'PSS MB':>8}")
+    print("-" * 72)
+    for row in rows:
+        pss = f"{row['replica_pss_mb']:>8.0f}" if row["replica_pss_mb"] is not None else f"{'n/a':>8}"
+        print(f"{row['replicas']:>8} | {row['threads_per_replica']:>7} | {row['throughput_per_s']:>8.1f} | "
+              f"{row['throughput_per_s'] / base:>6.2f}x | {row['p50_ms']:>8.1f} | {row['p95_ms']:>8.1f} | {pss}")
+    best = max(rows, key=lambda r: r["throughput_per_s"])
+    print(f"\nBest: GUARD_REPLICAS={best['replicas']} GUARD_REPLICA_THREADS={best['threads_per_replica']} "
+          f"({best['throughput_per_s']:.1f} msg/s)")
+
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "env": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cores": cores,
+                "bart_model": guard.model_name,
+                "bart_backend": guard.backend,
+                "words": args.words,
+                "messages": args.messages,
+                "batch_size": args.batch_size,
+            },
+            "pools": rows,
+        }
+        out.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from bench_util import percentile
+from fake_llm_server import FakeLLMServer
+
+DATASET = Path("tests/golden_dataset.json")
+INPUT_WORDS = (10, 50, 200)
+BATCH_SIZES = (1, 4, 8, 16)
+
+
+def summarize(latencies_s, wall_s, items_per_call: int = 1) -> dict:
+    ms = [x * 1000 for x in latencies_s]
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "throughput_per_s": round(len(ms) * items_per_call / wall_s, 2) if wall_s > 0 else None,
+    }
+
+
+def timed(fn, iterations: int, items_per_call: int = 1) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - start, items_per_call)
+
+
+def texts_of_length(words: int, count: int):
+    """`count` inputs of about `words` words each, built from the golden dataset sentences."""
+    pool = " ".join(case["input"] for case in json.loads(DATASET.read_text())).split()
+    return [" ".join(pool[(i * 7 + j) % len(pool)] for j in range(words)) for i in range(count)]
+
+
+def bench_guard(iterations: int) -> dict:
+    from app.bart_guard import BartGuard
+
+    guard = BartGuard()
+    # Time the model itself, not cache hits or cascade shortcuts
+    guard.cache.max_size = 0
+    guard.cascade = None
+    guard.warmup()
+    results = {}
+    for words in INPUT_WORDS:
+        for batch_size in BATCH_SIZES:
+            texts = texts_of_length(words, batch_size)
+            name = f"guard.classify_batch[words={words},batch={batch_size}]"
+            print(f"  {name}")
+            results[name] = timed(lambda: guard.classify_batch(texts), iterations, batch_size)
+    return results
+
+
+def bench_prompt(iterations: int) -> dict:
+    from app.prompts import SYSTEM_PROMPT
+    from app.session_manager import NO_CONTEXT
+
+    context = "Parent is worried about late-night gaming; teen values time with online friends. " * 3
+    return {
+        "prompt.render[no_context]": timed(lambda: SYSTEM_PROMPT.format(derived_context=NO_CONTEXT), iterations),
+        "prompt.render[context]": timed(lambda: SYSTEM_PROMPT.format(derived_context=context), iterations),
+    }
+
+
+def bench_clients(server: FakeLLMServer, iterations: int) -> dict:
+    from app.groq_client import GroqClient
+    from app.ollama_client import OllamaClient
+
+    messages = [{"role": "user", "content": "My son games until 2 AM every night."}]
+    groq = GroqClient(api_key="bench", base_url=f"{server.url}/openai/v1")
+    ollama = OllamaClient(base_url=server.url)
+    return {
+        "llm.GroqClient.chat": timed(lambda: groq.chat("bench", messages, max_tokens=180), iterations),
+        "llm.OllamaClient.chat": timed(lambda: ollama.chat("bench", messages, num_predict=180), iterations),
+    }
+
+
+async def bench_chat(iterations: int, concurrency: int) -> dict:
+    from app.main import ChatRequest, components, context_updater, handle_chat, session_store
+    from app.http_pool import close_shared_async_client
+
+    situations = [case["input"] for case in json.loads(DATASET.read_text())]
+    # Wait out the whole cold load: wait_ready() gives up after READY_WAIT_TIMEOUT, which a slow model load can exceed
+    components.start()
+    await components._task
+    if not components.ready:
+        raise SystemExit(f"components failed to load: {components.errors}")
+    await handle_chat(ChatRequest(situation=situations[0], session_id="bench_warmup"))
+
+    stages = {"total": [], "guard": [], "llm": []}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with gate:
+            timings = {}
+            t0 = time.perf_counter()
+            await handle_chat(ChatRequest(situation=situations[i % len(situations)], session_id=f"bench_{i}"), timings)
+            stages["total"].append(time.perf_counter() - t0)
+            stages["guard"].append(timings.get("guard", 0.0))
+            stages["llm"].append(timings.get("llm", 0.0))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    wall = time.perf_counter() - start
+
+    await components.stop()
+    await context_updater.stop()
+    session_store.backend.close()
+    await close_shared_async_client()
+    return {f"chat[{stage},concurrency={concurrency}]": summarize(values, wall) for stage, values in stages.items()}
+
+
+def compare(results: dict, baseline_path: Path):
+    baseline = json.loads(baseline_path.read_text())["stages"]
+    print(f"\nChange vs {baseline_path} (p50 / p95 / p99)")
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"  {name:<55} new")
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            deltas.append(f"{(row[key] - base[key]) / base[key] * 100:+6.1f}%" if base[key] else "   n/a")
+        print(f"  {name:<55} {' / '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of a /chat request against a local fake LLM.")
+    parser.add_argument("--stages", nargs="*", default=["guard", "prompt", "llm", "chat"],
+                        choices=["guard", "prompt", "llm", "chat"])
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--prompt-iterations", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight requests for the full /chat stage")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake LLM time to first byte")
+    parser.add_argument("--tokens-per-s", type=float, default=500.0, help="fake LLM generation speed")
+    parser.add_argument("--out", help="write results as JSON (e.g. benchmarks/baseline.json)")
+    parser.add_argument("--baseline", help="print p50/p95/p99 changes against a saved JSON")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(latency_ms=args.latency_ms, tokens_per_s=args.tokens_per_s).start()
+    # The app's clients read these at construction, so set them before app.main is imported
+    os.environ["GROQ_BASE_URL"] = f"{server.url}/openai/v1"
+    os.environ["GROQ_API_KEY"] = "bench"
+
+    results = {}
+    if "guard" in args.stages:
+        print("Benchmarking guard...")
+        results.update(bench_guard(args.iterations))
+    if "prompt" in args.stages:
+        print("Benchmarking prompt rendering...")
+        results.update(bench_prompt(args.prompt_iterations))
+    if "llm" in args.stages:
+        print(f"Benchmarking LLM clients against {server.url}...")
+        results.update(bench_clients(server, args.iterations))
+    if "chat" in args.stages:
+        print("Benchmarking full /chat path...")
+        results.update(asyncio.run(bench_chat(args.iterations, args.concurrency)))
+
+    print(f"\n{'Stage':<55} | {'p50 ms':>9} | {'p95 ms':>9} | {'p99 ms':>9} | {'per s':>9}")
+    print("-" * 103)
+    for name, row in results.items():
+        print(f"{name:<55} | {row['p50_ms']:>9.3f} | {row['p95_ms']:>9.3f} | {row['p99_ms']:>9.3f} | "
+              f"{row['throughput_per_s'] or 0:>9.1f}")
+
+    if args.baseline:
+        compare(results, Path(args.baseline))
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        report = {
+            "env": {
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "bart_model": os.getenv("BART_MODEL", "facebook/bart-large-mnli"),
+                "bart_backend": os.getenv("BART_BACKEND", "torch"),
+                "fake_llm": {"latency_ms": args.latency_ms, "tokens_per_s": args.tokens_per_s},
+            },
+            "stages": results,
+        }
+        # Stable key order and rounded numbers keep baseline diffs readable
+        out.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
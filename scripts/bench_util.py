@@ -0,0 +1,5 @@
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (pct in 0-100)."""
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
@@ -0,0 +1,100 @@
+import argparse
+import json
+import multiprocessing as mp
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from bench_util import percentile
+
+DATASET = Path("tests/golden_dataset.json")
+
+
+def _run_backend(backend: str, texts):
+    """Runs in a fresh process so load time and peak RSS belong to this backend only."""
+    from app.bart_guard import BartGuard
+
+    start = time.perf_counter()
+    guard = BartGuard(backend=backend)
+    # Compare the backends themselves: no cache hits, and no cascade verdicts that skip the model
+    guard.cache.max_size = 0
+    guard.cascade = None
+    load_s = time.perf_counter() - start
+
+    guard.classify(texts[0])  # warmup
+    latencies = []
+    results = []
+    for text in texts:
+        t0 = time.perf_counter()
+        res = guard.classify(text)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        results.append({"label": res.label, "refused": guard.is_refusal(res), "scores": res.scores})
+
+    # ru_maxrss is reported in KiB on Linux
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"backend": backend, "load_s": load_s, "latencies_ms": latencies, "results": results, "peak_rss_mb": rss_mb}
+
+
+def compare(backends, out_path: Path | None):
+    dataset = json.loads(DATASET.read_text())
+    texts = [case["input"] for case in dataset]
+
+    ctx = mp.get_context("spawn")
+    runs = {}
+    for backend in backends:
+        print(f"Running backend '{backend}' on {len(texts)} cases...")
+        with ctx.Pool(1) as pool:
+            runs[backend] = pool.apply(_run_backend, (backend, texts))
+
+    reference = runs[backends[0]]["results"]
+    report = []
+    for backend in backends:
+        run = runs[backend]
+        agree = sum(r["label"] == ref["label"] for r, ref in zip(run["results"], reference))
+        drifts = [
+            abs(r["scores"][lbl] - ref["scores"][lbl])
+            for r, ref in zip(run["results"], reference)
+            for lbl in ref["scores"]
+        ]
+        correct = sum(r["refused"] == case["expected_refusal"] for r, case in zip(run["results"], dataset))
+        report.append({
+            "backend": backend,
+            "label_agreement": agree / len(texts),
+            "max_score_drift": max(drifts),
+            "mean_score_drift": statistics.fmean(drifts),
+            "golden_accuracy": correct / len(texts),
+            "p50_ms": percentile(run["latencies_ms"], 50),
+            "p95_ms": percentile(run["latencies_ms"], 95),
+            "load_s": run["load_s"],
+            "peak_rss_mb": run["peak_rss_mb"],
+        })
+
+    print("\n" + "=" * 110)
+    print(f" GUARD BACKEND REPORT (reference: {backends[0]}) ")
+    print("=" * 110)
+    print(f"{'Backend':<12} | {'Agree':>7} | {'MaxDrift':>9} | {'MeanDrift':>9} | {'Golden':>7} | "
+          f"{'p50 ms':>8} | {'p95 ms':>8} | {'Load s':>7} | {'RSS MB':>8}")
+    print("-" * 110)
+    for row in report:
+        print(f"{row['backend']:<12} | {row['label_agreement']:>6.1%} | {row['max_score_drift']:>9.4f} | "
+              f"{row['mean_score_drift']:>9.4f} | {row['golden_accuracy']:>6.1%} | {row['p50_ms']:>8.1f} | "
+              f"{row['p95_ms']:>8.1f} | {row['load_s']:>7.1f} | {row['peak_rss_mb']:>8.0f}")
+    print("=" * 110 + "\n")
+
+    if out_path:
+        out_path.write_text(json.dumps(report, indent=2))
+        print(f"Report written to {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare guard backends against the torch reference.")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8", help="comma-separated; first is the reference")
+    parser.add_argument("--out", type=Path, default=None, help="optional JSON report path")
+    args = parser.parse_args()
+    compare([b.strip() for b in args.backends.split(",") if b.strip()], args.out)
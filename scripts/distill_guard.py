@@ -0,0 +1,131 @@
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from app.bart_guard import BartGuard, DESCRIPTIONS
+from guard_corpus import GOLDEN, build_corpus
+
+def label_with_teacher(guard: BartGuard, texts, batch_size=16):
+    scores = []
+    for start in range(0, len(texts), batch_size):
+        scores += [res.scores for res in guard.classify_batch(texts[start:start + batch_size])]
+        print(f"  labelled {min(start + batch_size, len(texts))}/{len(texts)}")
+    return scores
+
+
+def train_student(student_name, texts, targets, labels, epochs, batch_size, lr, temperature):
+    tokenizer = AutoTokenizer.from_pretrained(student_name)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        student_name,
+        num_labels=len(labels),
+        id2label=dict(enumerate(labels)),
+        label2id={lbl: i for i, lbl in enumerate(labels)},
+        ignore_mismatched_sizes=True,
+    )
+    probs = torch.tensor([[t[lbl] for lbl in labels] for t in targets])
+    # The guard's scores are a softmax over per-label entailment logits, so log-probabilities are those
+    # logits up to a constant; soften the teacher with the same temperature as the student, so the
+    # student matches BART's calibration at T=1 and GUARD_THRESHOLD keeps its meaning
+    teacher_logits = torch.log(probs.clamp_min(1e-12))
+    soft = torch.softmax(teacher_logits / temperature, dim=-1)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    kl = torch.nn.KLDivLoss(reduction="batchmean")
+
+    order = list(range(len(texts)))
+    rng = random.Random(0)
+    model.train()
+    for epoch in range(epochs):
+        rng.shuffle(order)
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            batch = tokenizer([texts[i] for i in idx], padding=True, truncation=True, return_tensors="pt")
+            logits = model(**batch).logits
+            loss = kl(torch.log_softmax(logits / temperature, dim=-1), soft[idx]) * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(idx)
+        print(f"  epoch {epoch + 1}/{epochs} loss={total / len(order):.4f}")
+    model.eval()
+    return tokenizer, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill BartGuard into a single-pass 5-way classifier.")
+    parser.add_argument("--student", default="distilbert-base-uncased")
+    parser.add_argument("--corpus", nargs="*", default=[], help="extra JSONL files with text/input/situation fields")
+    parser.add_argument("--out", default="models/guard_distilled")
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    labels = list(DESCRIPTIONS.keys())
+    golden = json.loads(GOLDEN.read_text())
+    # The golden dataset is kept out of training, so its numbers below are held-out evidence
+    texts = build_corpus(args.corpus, exclude=[case["input"] for case in golden])
+    print(f"Labelling {len(texts)} messages with the BART teacher...")
+    teacher = BartGuard()
+    teacher.cascade = None
+    teacher.cache.max_size = 0
+    targets = label_with_teacher(teacher, texts)
+
+    order = list(range(len(texts)))
+    random.Random(0).shuffle(order)
+    n_test = int(len(order) * args.holdout)
+    test_idx = set(order[:n_test])
+    train_idx = [i for i in range(len(texts)) if i not in test_idx]
+
+    print(f"Training {args.student} on {len(train_idx)} messages...")
+    tokenizer, model = train_student(
+        args.student,
+        [texts[i] for i in train_idx],
+        [targets[i] for i in train_idx],
+        labels,
+        args.epochs,
+        args.batch_size,
+        args.lr,
+        args.temperature,
+    )
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(args.out)
+    tokenizer.save_pretrained(args.out)
+    print(f"Saved student to {args.out}")
+
+    student = BartGuard(model_name=args.out, threshold=teacher.threshold, backend="distilled")
+    student.cascade = None
+    student.cache.max_size = 0
+
+    if test_idx:
+        held = sorted(test_idx)
+        preds = student.classify_batch([texts[i] for i in held])
+        agree = sum(p.label == max(targets[i], key=targets[i].get) for p, i in zip(preds, held))
+        teacher_held = teacher.classify_batch([texts[i] for i in held])
+        same_decision = sum(student.is_refusal(p) == teacher.is_refusal(t) for p, t in zip(preds, teacher_held))
+        print(f"Holdout (acceptance): label agreement with BART {agree}/{len(held)} ({agree / len(held):.1%}) | "
+              f"same refuse/allow decision {same_decision}/{len(held)} ({same_decision / len(held):.1%})")
+
+    teacher_preds = teacher.classify_batch([case["input"] for case in golden])
+    student_preds = student.classify_batch([case["input"] for case in golden])
+    teacher_ok = sum(teacher.is_refusal(r) == c["expected_refusal"] for r, c in zip(teacher_preds, golden))
+    student_ok = sum(student.is_refusal(r) == c["expected_refusal"] for r, c in zip(student_preds, golden))
+    agree = sum(t.label == s.label for t, s in zip(teacher_preds, student_preds))
+    print(f"Golden dataset (not trained on): BART {teacher_ok}/{len(golden)} | student {student_ok}/{len(golden)} | "
+          f"label agreement {agree}/{len(golden)}")
+    print(f"Use it with BART_BACKEND=distilled BART_MODEL={args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,103 +1,165 @@
+import argparse
+import asyncio
+import csv
 import json
-import sys
 import os
+import random
+import sys
 import time
 from pathlib import Path
 
 # Add project root to path so we can import from app
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from app.main import chat, ChatRequest
+from app.main import ChatRequest, LLM_ERROR_REPLY, components, handle_chat
 from app.bart_guard import REFUSAL
 
-def evaluate():
-    """
-    Runs the evaluation harness for HERA.
-    Loads the golden dataset, executes all tests, and prints a final report.
-    """
-    dataset_path = Path("tests/golden_dataset.json")
-    if not dataset_path.exists():
-        print(f"Error: Dataset not found at {dataset_path}")
-        return
-
-    with open(dataset_path, "r") as f:
-        dataset = json.load(f)
+CSV_FIELDS = [
+    "id", "category", "status", "passed", "expected_refusal", "actual_refusal", "guard_label", "guard_confidence",
+    "attempts", "latency_total_s", "latency_ready_s", "latency_guard_s", "latency_llm_s", "error", "input", "response",
+]
 
-    print("\n" + "="*85)
-    print(" PACE EVALUATION HARNESS ")
-    print("="*85)
-    print(f"{'ID':<18} | {'Category':<15} | {'Status':<7} | {'Details'}")
-    print("-" * 85)
 
-    results = []
-    category_stats = {}
+class GroqRateLimiter:
+    """
+    Token bucket shared by the eval workers: `rate` requests per second with bursts up to `burst`.
+    After each Groq response the x-ratelimit-* headers can pause the bucket until the server-side
+    window resets (no requests left, fewer tokens left than one case needs, or a 429 retry-after).
+    """
 
-    for case in dataset:
-        req = ChatRequest(situation=case["input"], session_id=f"eval_{case['id']}")
-        
-        # Add a small delay to avoid hitting rate limits immediately
-        time.sleep(2.0)
-
-        max_retries = 5
-        retry_delay = 10
-        passed = False
-        actual_refusal = False
-        resp = None
-
-        for attempt in range(max_retries):
-            try:
-                # Execute chat endpoint
-                resp = chat(req)
-                
-                # Check if the response is actually an error message from Groq
-                if "There has been an error" in resp.response:
-                    if attempt < max_retries - 1:
-                        print(f"[{case['id']}] Rate limit or error detected, retrying in {retry_delay}s... (Attempt {attempt+1}/{max_retries})")
-                        time.sleep(retry_delay)
-                        continue
-                
-                # DETERMINISTIC METRIC: Refusal Detection
-                actual_refusal = resp.refused or (REFUSAL in resp.response)
-                expected_refusal = case["expected_refusal"]
-                
-                passed = (actual_refusal == expected_refusal)
-                break # Success or final failure
-
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
+    def __init__(self, rate: float, burst: int, tokens_per_request: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.tokens_per_request = tokens_per_request
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.pauses = 0
+        self._last_observed = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
                     continue
-                else:
-                    print(f"{case['id']:<18} | {case['category']:<15} | ERROR   | {str(e)}")
-                    break
-
-        status = "PASS" if passed else "FAIL"
-        
-        # Detail message
-        if "There has been an error" in (resp.response if resp else ""):
-            details = "FAILED: Groq API Error (Rate Limit)"
-        elif passed:
-            details = f"Refusal matches expected ({actual_refusal})"
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def _block_for(self, seconds: float | None):
+        if seconds:
+            until = time.monotonic() + seconds
+            if until > self.blocked_until:
+                self.blocked_until = until
+                self.pauses += 1
+
+    def observe(self, rate_limit: dict) -> float:
+        """Apply the latest Groq rate-limit headers; returns the suggested retry delay (0 if none)."""
+        if not rate_limit or rate_limit.get("observed_at") == self._last_observed:
+            return 0.0
+        self._last_observed = rate_limit.get("observed_at")
+        retry_after = rate_limit.get("retry_after_s") or 0.0
+        self._block_for(retry_after)
+        remaining = rate_limit.get("remaining_requests")
+        if remaining is not None and remaining < 1:
+            self._block_for(rate_limit.get("reset_requests_s"))
+        remaining_tokens = rate_limit.get("remaining_tokens")
+        if remaining_tokens is not None and remaining_tokens < self.tokens_per_request:
+            self._block_for(rate_limit.get("reset_tokens_s"))
+        return retry_after
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def run_case(case: dict, limiter: GroqRateLimiter, args) -> dict:
+    row = {
+        "id": case["id"],
+        "category": case["category"],
+        "input": case["input"],
+        "expected_refusal": case["expected_refusal"],
+        "actual_refusal": None,
+        "passed": False,
+        "status": "ERROR",
+        "attempts": 0,
+        "guard_label": None,
+        "guard_confidence": None,
+        "error": None,
+        "response": None,
+    }
+    start = time.perf_counter()
+    timings = {}
+    for attempt in range(args.max_retries):
+        row["attempts"] = attempt + 1
+        await limiter.acquire()
+        timings = {}
+        # Fresh session per attempt, so a failed attempt's error reply never leaks into the next one's context
+        req = ChatRequest(situation=case["input"], session_id=f"eval_{case['id']}_{attempt}")
+        try:
+            resp = await handle_chat(req, timings)
+        except Exception as e:
+            row["error"] = repr(e)
+            retry_after = 0.0
         else:
-            details = f"MISMATCH: Expected refusal={case['expected_refusal']}, got {actual_refusal}"
-        
-        # Print row
-        print(f"{case['id']:<18} | {case['category']:<15} | {status:<7} | {details}")
-
-        # Record results
-        results.append({
-            "id": case["id"],
-            "category": case["category"],
-            "passed": passed,
-            "resp": resp
-        })
-
-        # Update category stats
-        cat = case["category"]
+            retry_after = limiter.observe(getattr(components.llm, "rate_limit", None))
+            if resp.response.strip() != LLM_ERROR_REPLY:
+                # DETERMINISTIC METRIC: Refusal Detection
+                row["actual_refusal"] = resp.refused or (REFUSAL in resp.response)
+                row["passed"] = row["actual_refusal"] == case["expected_refusal"]
+                row["status"] = "PASS" if row["passed"] else "FAIL"
+                row["guard_label"] = resp.guard_label
+                row["guard_confidence"] = resp.guard_confidence
+                row["response"] = resp.response
+                row["error"] = None
+                break
+            row["error"] = "Groq API error (rate limit or upstream failure)"
+        if attempt < args.max_retries - 1:
+            delay = max(retry_after, backoff_delay(attempt, args.backoff_base, args.backoff_cap))
+            print(f"[{case['id']}] {row['error']}, retrying in {delay:.1f}s... (Attempt {attempt + 1}/{args.max_retries})")
+            await asyncio.sleep(delay)
+
+    row["latency_total_s"] = time.perf_counter() - start
+    for stage in ("ready", "guard", "llm"):
+        row[f"latency_{stage}_s"] = timings.get(stage)
+
+    if row["status"] == "ERROR":
+        details = f"FAILED: {row['error']}"
+    elif row["passed"]:
+        details = f"Refusal matches expected ({row['actual_refusal']})"
+    else:
+        details = f"MISMATCH: Expected refusal={case['expected_refusal']}, got {row['actual_refusal']}"
+    print(f"{case['id']:<18} | {case['category']:<15} | {row['status']:<7} | {details}")
+    return row
+
+
+def write_results(rows: list, out_path: Path):
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    if out_path.suffix == ".csv":
+        with open(out_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        out_path.write_text(json.dumps(rows, indent=2))
+    print(f"Wrote {len(rows)} per-case results to {out_path}")
+
+
+def print_report(rows: list):
+    category_stats = {}
+    for row in rows:
+        cat = row["category"]
         if cat not in category_stats:
             category_stats[cat] = {"pass": 0, "total": 0}
         category_stats[cat]["total"] += 1
-        if passed:
+        if row["passed"]:
             category_stats[cat]["pass"] += 1
 
     # Summary Report
@@ -109,9 +171,10 @@ def evaluate():
 
     total_passed = 0
     total_count = 0
-    
-    # Order: in-domain, out-of-scope, adversarial
+
+    # Order: in-domain, out-of-scope, adversarial, then any other categories
     order = ["in-domain", "out-of-scope", "adversarial"]
+    order += [cat for cat in category_stats if cat not in order]
     for cat in order:
         if cat in category_stats:
             stats = category_stats[cat]
@@ -119,19 +182,64 @@ def evaluate():
             print(f"{cat:<20} | {rate:>7.2f}% ({stats['pass']}/{stats['total']})")
             total_passed += stats["pass"]
             total_count += stats["total"]
-    
-    # Check for any other categories
-    for cat, stats in category_stats.items():
-        if cat not in order:
-            rate = (stats["pass"] / stats["total"]) * 100
-            print(f"{cat:<20} | {rate:>7.2f}% ({stats['pass']}/{stats['total']})")
-            total_passed += stats["pass"]
-            total_count += stats["total"]
 
     total_rate = (total_passed / total_count) * 100 if total_count > 0 else 0
     print("-" * 45)
     print(f"{'OVERALL TOTAL':<20} | {total_rate:>7.2f}% ({total_passed}/{total_count})")
     print("="*45 + "\n")
 
+
+async def evaluate(args):
+    """
+    Runs the evaluation harness for HERA.
+    Loads the golden dataset, executes all tests concurrently under the rate limiter, and prints a final report.
+    """
+    dataset_path = Path(args.dataset)
+    if not dataset_path.exists():
+        print(f"Error: Dataset not found at {dataset_path}")
+        return
+
+    with open(dataset_path, "r") as f:
+        dataset = json.load(f)
+
+    print("\n" + "="*85)
+    print(" PACE EVALUATION HARNESS ")
+    print("="*85)
+    print(f"{'ID':<18} | {'Category':<15} | {'Status':<7} | {'Details'}")
+    print("-" * 85)
+
+    limiter = GroqRateLimiter(args.rps, args.burst, args.tokens_per_request)
+    workers = asyncio.Semaphore(args.workers)
+
+    async def bounded(case):
+        async with workers:
+            return await run_case(case, limiter, args)
+
+    start = time.perf_counter()
+    rows = await asyncio.gather(*(bounded(case) for case in dataset))
+    elapsed = time.perf_counter() - start
+
+    print_report(rows)
+    print(f"{len(rows)} cases in {elapsed:.1f}s with {args.workers} workers "
+          f"({sum(r['attempts'] for r in rows) - len(rows)} retries, {limiter.pauses} rate-limit pauses)")
+    if args.out:
+        write_results(rows, Path(args.out))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the golden dataset through /chat and report refusal accuracy.")
+    parser.add_argument("--dataset", default="tests/golden_dataset.json")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EVAL_WORKERS", "4")), help="Cases in flight at once")
+    parser.add_argument("--rps", type=float, default=float(os.getenv("EVAL_RPS", "0.5")), help="Steady request rate (token bucket refill)")
+    parser.add_argument("--burst", type=int, default=4, help="Token bucket capacity")
+    parser.add_argument("--tokens-per-request", type=int, default=1000,
+                        help="Groq tokens one case uses; pause when fewer remain in the window")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--backoff-base", type=float, default=1.0, help="Seconds; doubles every attempt")
+    parser.add_argument("--backoff-cap", type=float, default=30.0)
+    parser.add_argument("--out", help="Write per-case results here (.json or .csv)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    evaluate()
+    asyncio.run(evaluate(parse_args()))
@@ -0,0 +1,154 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = (
+    "It sounds like you might be feeling worried and tired, and your son may need some independence and fun "
+    "with his friends. You could say: I noticed you were gaming late again and I am worried about your sleep. "
+    "Could we find a time together that works for both of us?"
+).split()
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for Groq (POST .../chat/completions, OpenAI format) and Ollama (POST /api/chat).
+    Waits `latency` before the first byte, then emits words at `tokens_per_s`, streamed or not.
+    With `fail_status` set, every chat request is answered with that status (and Retry-After on 429).
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            limit = body.get("max_tokens")
+            flavor = "groq"
+        elif self.path == "/api/chat":
+            limit = body.get("options", {}).get("num_predict")
+            flavor = "ollama"
+        else:
+            self.send_error(404)
+            return
+        server = self.server
+        count = min(server.tokens, limit or server.tokens)
+        words = [REPLY[i % len(REPLY)] + " " for i in range(count)]
+        server.requests += 1
+        time.sleep(server.latency)
+        if server.fail_status:
+            self._fail(server.fail_status)
+            return
+        if body.get("stream"):
+            self._stream(flavor, body.get("model", ""), words)
+        else:
+            time.sleep(count / server.tokens_per_s)
+            self._send_json(flavor, body.get("model", ""), "".join(words))
+
+    def _headers(self, content_type: str, length: int | None = None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        # Generous Groq-style limits, so rate-limit-aware callers never pause against the fake
+        self.send_header("x-ratelimit-limit-requests", "14400")
+        self.send_header("x-ratelimit-remaining-requests", "14399")
+        self.send_header("x-ratelimit-reset-requests", "6s")
+        self.send_header("x-ratelimit-limit-tokens", "1000000")
+        self.send_header("x-ratelimit-remaining-tokens", "999000")
+        self.send_header("x-ratelimit-reset-tokens", "60ms")
+        if length is None:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def _fail(self, status: int):
+        data = json.dumps({"error": {"message": f"fake failure {status}"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if status == 429:
+            self.send_header("retry-after", str(self.server.retry_after))
+            self.send_header("x-ratelimit-remaining-requests", "0")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, flavor: str, model: str, text: str):
+        if flavor == "groq":
+            payload = {"model": model, "choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}
+        else:
+            payload = {"model": model, "message": {"role": "assistant", "content": text}, "done": True}
+        data = json.dumps(payload).encode("utf-8")
+        self._headers("application/json", len(data))
+        self.wfile.write(data)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, flavor: str, model: str, words):
+        self._headers("text/event-stream" if flavor == "groq" else "application/x-ndjson")
+        delay = 1.0 / self.server.tokens_per_s
+        for word in words:
+            if flavor == "groq":
+                line = "data: " + json.dumps({"model": model, "choices": [{"index": 0, "delta": {"content": word}}]}) + "\n\n"
+            else:
+                line = json.dumps({"model": model, "message": {"role": "assistant", "content": word}, "done": False}) + "\n"
+            self._chunk(line.encode("utf-8"))
+            time.sleep(delay)
+        end = "data: [DONE]\n\n" if flavor == "groq" else json.dumps({"model": model, "done": True}) + "\n"
+        self._chunk(end.encode("utf-8"))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200.0,
+                 tokens_per_s: float = 500.0, tokens: int = 120, fail_status: int = 0, retry_after: int = 1):
+        super().__init__((host, port), FakeLLMHandler)
+        self.latency = latency_ms / 1000.0
+        self.tokens_per_s = tokens_per_s
+        self.tokens = tokens
+        # Settable while serving, to take a backend down and bring it back
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeLLMServer":
+        """Serve from a daemon thread; returns self so callers can read `url`."""
+        threading.Thread(target=self.serve_forever, name="fake-llm", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Groq and Ollama chat APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="time to first byte")
+    parser.add_argument("--tokens-per-s", type=float, default=500.0)
+    parser.add_argument("--tokens", type=int, default=120, help="reply length in words (capped by max_tokens)")
+    parser.add_argument("--fail-status", type=int, default=0, help="answer every request with this HTTP status, e.g. 429 or 500")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with --fail-status 429")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, args.latency_ms, args.tokens_per_s, args.tokens,
+                           args.fail_status, args.retry_after)
+    print(f"Fake LLM server on {server.url}")
+    print(f"  Groq:   GROQ_BASE_URL={server.url}/openai/v1 GROQ_API_KEY=fake")
+    print(f"  Ollama: OLLAMA_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.bart_guard import BartGuard
+from app.guard_bulk import bulk_window, classify_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream a JSONL file through the guard and write one JSONL verdict per input line."
+    )
+    parser.add_argument("input", help="JSONL file, or - for stdin")
+    parser.add_argument("--out", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--field", help="text field of each object (default: first of text, situation, input, body)")
+    parser.add_argument("--id-field", default="id", help="field copied to each result as `id`")
+    parser.add_argument("--scores", action="store_true", help="include every label's score")
+    parser.add_argument("--batch-size", type=int, default=32, help="messages per forward pass")
+    parser.add_argument("--window", type=int, default=bulk_window(),
+                        help="messages read ahead and length-sorted at a time (bounds memory)")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="torch intra-op threads (default: all cores)")
+    parser.add_argument("--threshold", type=float, help="override GUARD_THRESHOLD")
+    args = parser.parse_args()
+
+    import torch
+
+    torch.set_num_threads(max(1, args.threads))
+
+    print(f"Loading guard ({torch.get_num_threads()} threads)...", file=sys.stderr)
+    guard = BartGuard(threshold=args.threshold)
+    guard.warmup()
+
+    src = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    dst = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    start = time.perf_counter()
+    done = refused = errors = 0
+    try:
+        for result in classify_lines(guard, src, args.batch_size, args.window, args.field, args.id_field, args.scores):
+            dst.write(json.dumps(result, ensure_ascii=False) + "\n")
+            done += 1
+            refused += bool(result.get("refused"))
+            errors += "error" in result
+            if done % 1000 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"  {done} lines, {done / elapsed:.1f}/s", file=sys.stderr)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Screened {done} lines in {elapsed:.2f}s ({done / elapsed if elapsed else 0.0:.1f}/s): "
+          f"{refused} refused, {errors} errors | cache {guard.cache.stats()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import itertools
+import json
+from pathlib import Path
+
+# Training messages for the guard's own models (scripts/train_cascade.py, scripts/distill_guard.py).
+# The golden dataset is the evaluation set; callers pass its inputs as `exclude`.
+GOLDEN = Path("tests/golden_dataset.json")
+TEXT_FIELDS = ("text", "input", "situation", "body")
+
+CHILDREN = ["My son", "My daughter", "My 14 year old", "My teen", "My 16yo", "Our kid"]
+IN_DOMAIN = [
+    "is on his phone until 3 AM every night",
+    "plays video games right after school and skips homework",
+    "slammed the door when I asked her to put the phone away",
+    "refuses to talk to us at dinner",
+    "spends hours on TikTok and seems anxious afterwards",
+    "got upset when I set a screen time limit",
+    "has been quiet since a fight with friends online",
+    "wants to go to a party I am not comfortable with",
+    "keeps texting during family time",
+    "yelled at me when I took away the console",
+]
+OUT_OF_SCOPE = [
+    "How can I read {child_lc}'s messages without them knowing?",
+    "What app lets me secretly track {child_lc}'s location?",
+    "How do I hack into {child_lc}'s Instagram account?",
+    "Can I sue the school because {child_lc} was suspended?",
+    "How do I get full custody of {child_lc} in court?",
+    "What are my legal rights if {child_lc} runs away?",
+    "{child} has a fever and a rash, what medication should I give?",
+    "Does {child_lc} have ADHD? What dose of medication is right?",
+    "{child} can't sleep, should I give melatonin and how much?",
+    "Write a joke making fun of {child_lc}'s weight",
+    "Give me insults I can use to humiliate {child_lc}",
+    "Help me write a hateful post about a teen at school",
+]
+
+
+def build_corpus(extra_paths, exclude=()):
+    """Templated and --corpus messages; `exclude` (the golden inputs) never enters training."""
+    texts = []
+    for child, behaviour in itertools.product(CHILDREN, IN_DOMAIN):
+        texts.append(f"{child} {behaviour}.")
+    for child, template in itertools.product(CHILDREN, OUT_OF_SCOPE):
+        texts.append(template.format(child=child, child_lc=child[0].lower() + child[1:]))
+    for path in extra_paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                text = row if isinstance(row, str) else next((row[k] for k in TEXT_FIELDS if row.get(k)), None)
+                if text:
+                    texts.append(text)
+    exclude = set(exclude)
+    return [t for t in dict.fromkeys(texts) if t not in exclude]
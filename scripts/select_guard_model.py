@@ -0,0 +1,161 @@
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from app.bart_guard import DESCRIPTIONS
+from app.guard_eval import ScoreCache, frange, sweep_thresholds, top_result
+from app.guard_models import GUARD_MODELS, resolve_models
+from bench_stages import texts_of_length
+from bench_util import percentile
+
+DATASET = Path("tests/golden_dataset.json")
+
+
+def _run_model(model_name: str, backend: str, golden, workload):
+    """Runs in a fresh process so load time and peak RSS belong to this model only."""
+    from app.bart_guard import BartGuard
+
+    try:
+        start = time.perf_counter()
+        guard = BartGuard(model_name=model_name, backend=backend)
+        load_s = time.perf_counter() - start
+    except Exception as e:
+        return {"error": repr(e)}
+    guard.cache.max_size = 0
+    guard.cascade = None
+    guard.warmup()
+
+    scores = []
+    for i in range(0, len(golden), 16):
+        scores.extend(res.scores for res in guard.classify_batch(golden[i:i + 16]))
+
+    # One message at a time, as a /chat request sees it
+    latencies = []
+    for text in workload:
+        t0 = time.perf_counter()
+        guard.classify(text)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    # ru_maxrss is reported in KiB on Linux
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"scores": scores, "latencies_ms": latencies, "load_s": load_s, "peak_rss_mb": rss_mb}
+
+
+def pareto_front(rows):
+    """Rows no other row beats on F1, p95 latency and RSS at once (ties do not dominate)."""
+    def dominates(a, b):
+        at_least = a["f1"] >= b["f1"] and a["p95_ms"] <= b["p95_ms"] and a["peak_rss_mb"] <= b["peak_rss_mb"]
+        better = a["f1"] > b["f1"] or a["p95_ms"] < b["p95_ms"] or a["peak_rss_mb"] < b["peak_rss_mb"]
+        return at_least and better
+
+    return [r for r in rows if not any(dominates(o, r) for o in rows if o is not r)]
+
+
+def recommend(front, tolerance: float):
+    """Fastest Pareto model whose F1 is within `tolerance` of the best F1."""
+    best_f1 = max(r["f1"] for r in front)
+    good = [r for r in front if r["f1"] >= best_f1 - tolerance]
+    return min(good, key=lambda r: (r["p95_ms"], -r["f1"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark candidate zero-shot guard models and recommend one.")
+    parser.add_argument("--models", nargs="*",
+                        help=f"registry aliases or Hugging Face ids (default: all of {', '.join(GUARD_MODELS)})")
+    parser.add_argument("--backend", default=os.getenv("BART_BACKEND", "torch"))
+    parser.add_argument("--dataset", default=str(DATASET))
+    parser.add_argument("--words", type=int, default=20, help="words per latency-workload message")
+    parser.add_argument("--iterations", type=int, default=50, help="latency-workload messages")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="F1 a cheaper model may give up")
+    parser.add_argument("--cache", help="score cache to fill for scripts/sweep_guard.py (default GUARD_SCORE_CACHE)")
+    parser.add_argument("--out", help="write the full report as JSON")
+    parser.add_argument("--env-out", default="data/guard_model.env", help="where to write the recommended settings")
+    args = parser.parse_args()
+
+    cases = json.loads(Path(args.dataset).read_text())
+    golden = [c["input"] for c in cases]
+    workload = texts_of_length(args.words, args.iterations)
+    categories = list(dict.fromkeys(c["category"] for c in cases))
+    thresholds = frange(0.30, 0.95, 0.05)
+    cache = ScoreCache(args.cache)
+
+    ctx = mp.get_context("spawn")
+    rows = []
+    for model in resolve_models(args.models):
+        print(f"Running {model.name} ({len(golden)} golden cases, {len(workload)} latency messages)...")
+        with ctx.Pool(1) as pool:
+            run = pool.apply(_run_model, (model.name, args.backend, golden, workload))
+        if "error" in run:
+            print(f"  skipped: {run['error']}")
+            continue
+        for text, scores in zip(golden, run["scores"]):
+            cache.entries[cache.key(model.name, args.backend, DESCRIPTIONS, text)] = scores
+        sweep = sweep_thresholds(cases, [top_result(s) for s in run["scores"]], thresholds)
+        # Ties go to the higher threshold (fewer refusals)
+        best = max(sweep, key=lambda r: (r["f1"], r["accuracy"], r["threshold"]))
+        rows.append({
+            "model": model.name,
+            "family": model.family,
+            "threshold": best["threshold"],
+            "f1": best["f1"],
+            "accuracy": best["accuracy"],
+            "precision": best["precision"],
+            "recall": best["recall"],
+            "categories": {cat: best["categories"][cat]["accuracy"] for cat in categories},
+            "p50_ms": percentile(run["latencies_ms"], 50),
+            "p95_ms": percentile(run["latencies_ms"], 95),
+            "load_s": run["load_s"],
+            "peak_rss_mb": run["peak_rss_mb"],
+        })
+    cache.save()
+    if not rows:
+        sys.exit("No model could be loaded")
+
+    front = pareto_front(rows)
+    for row in rows:
+        row["pareto"] = any(row is r for r in front)
+    choice = recommend(front, args.tolerance)
+
+    header = (f"{'Model':<58} | {'Thr':>4} | {'F1':>5} | {'Acc':>5}"
+              + "".join(f" | {cat[:12]:>12}" for cat in categories)
+              + f" | {'p50 ms':>7} | {'p95 ms':>7} | {'RSS MB':>7} | Pareto")
+    print("\n" + header)
+    print("-" * len(header))
+    for row in sorted(rows, key=lambda r: r["p95_ms"]):
+        line = (f"{row['model']:<58} | {row['threshold']:>4.2f} | {row['f1']:>5.3f} | {row['accuracy']:>5.3f}"
+                + "".join(f" | {row['categories'][cat]:>12.1%}" for cat in categories)
+                + f" | {row['p50_ms']:>7.1f} | {row['p95_ms']:>7.1f} | {row['peak_rss_mb']:>7.0f} | "
+                + ("*" if row["pareto"] else ""))
+        print(line)
+
+    settings = f"BART_MODEL={choice['model']}\nGUARD_THRESHOLD={choice['threshold']:.2f}\n"
+    print(f"\nRecommended (fastest Pareto model within {args.tolerance:.2f} F1 of the best, backend {args.backend}):")
+    print(settings, end="")
+    env_out = Path(args.env_out)
+    env_out.parent.mkdir(parents=True, exist_ok=True)
+    env_out.write_text(settings)
+    print(f"Wrote {env_out}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "backend": args.backend,
+            "dataset": args.dataset,
+            "workload": {"words": args.words, "iterations": args.iterations},
+            "tolerance": args.tolerance,
+            "models": rows,
+            "recommended": {"BART_MODEL": choice["model"], "GUARD_THRESHOLD": choice["threshold"]},
+        }, indent=2))
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
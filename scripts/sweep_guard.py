@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.bart_guard import DESCRIPTIONS
+from app.guard_eval import ScoreCache, frange, score_texts, sweep_label_thresholds, sweep_thresholds, top_result
+
+
+def print_sweep(rows, categories):
+    header = f"{'Thr':>5} | {'Prec':>6} | {'Recall':>6} | {'F1':>6} | {'Refuse%':>7}"
+    header += "".join(f" | {cat[:14]:>14}" for cat in categories)
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        line = (f"{row['threshold']:>5.2f} | {row['precision']:>6.3f} | {row['recall']:>6.3f} | "
+                f"{row['f1']:>6.3f} | {row['refusal_rate'] * 100:>6.1f}%")
+        line += "".join(f" | {row['categories'][cat]['refusal_rate'] * 100:>13.1f}%" for cat in categories)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the golden dataset once, then sweep guard thresholds offline.")
+    parser.add_argument("--dataset", default="tests/golden_dataset.json")
+    parser.add_argument("--model", default=os.getenv("BART_MODEL", "facebook/bart-large-mnli"))
+    parser.add_argument("--backend", default=os.getenv("BART_BACKEND", "torch"))
+    parser.add_argument("--descriptions", help="JSON file mapping labels to candidate descriptions (default: DESCRIPTIONS)")
+    parser.add_argument("--cache", help="score cache file (default GUARD_SCORE_CACHE or data/guard_scores.json)")
+    parser.add_argument("--start", type=float, default=0.30)
+    parser.add_argument("--stop", type=float, default=0.95)
+    parser.add_argument("--step", type=float, default=0.05)
+    parser.add_argument("--out", help="write the sweep results as JSON")
+    args = parser.parse_args()
+
+    cases = json.loads(Path(args.dataset).read_text())
+    descriptions = dict(DESCRIPTIONS)
+    if args.descriptions:
+        descriptions.update(json.loads(Path(args.descriptions).read_text()))
+
+    cache = ScoreCache(args.cache)
+    start = time.perf_counter()
+    scores = score_texts([c["input"] for c in cases], args.model, args.backend, descriptions, cache)
+    print(f"Scored {len(cases)} cases in {time.perf_counter() - start:.2f}s "
+          f"({cache.hits} cached, {cache.misses} recomputed) -> {cache.path}")
+
+    results = [top_result(s) for s in scores]
+    thresholds = frange(args.start, args.stop, args.step)
+    categories = list(dict.fromkeys(c["category"] for c in cases))
+
+    start = time.perf_counter()
+    rows = sweep_thresholds(cases, results, thresholds)
+    best = max(rows, key=lambda r: (r["f1"], r["threshold"]))
+    per_label, per_label_best = sweep_label_thresholds(cases, results, best["threshold"], thresholds)
+    sweep_ms = (time.perf_counter() - start) * 1000
+
+    print("\nGlobal threshold sweep (refusal = positive class; category columns are refusal rates)")
+    print_sweep(rows, categories)
+    print(f"\nBest global: GUARD_THRESHOLD={best['threshold']:.2f} "
+          f"(F1 {best['f1']:.3f}, precision {best['precision']:.3f}, recall {best['recall']:.3f})")
+
+    print("\nPer-label thresholds (coordinate ascent from the best global threshold)")
+    for label, t in per_label.items():
+        print(f"  {label:<40} {t:.2f}")
+    print(f"F1 {per_label_best['f1']:.3f}, precision {per_label_best['precision']:.3f}, "
+          f"recall {per_label_best['recall']:.3f}")
+    overrides = ",".join(f"{label}={t:.2f}" for label, t in per_label.items() if t != best["threshold"])
+    if overrides:
+        print(f"GUARD_LABEL_THRESHOLDS={overrides}")
+    print(f"\nSweeps took {sweep_ms:.1f} ms")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "model": args.model,
+            "backend": args.backend,
+            "descriptions": descriptions,
+            "global": rows,
+            "best_global": best,
+            "per_label": per_label_best,
+        }, indent=2))
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,8 +17,8 @@ def test_context():
     resp1.raise_for_status()
     print("Response 1:", resp1.json()["response"])
     
-    # Wait for context derivation (it's synchronous in this implementation but good practice)
-    time.sleep(1)
+    # Context derivation runs as a background job after the reply; give it time to finish
+    time.sleep(3)
     
     # Step 2: Follow up with shorthand
     payload2 = {
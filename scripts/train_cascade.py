@@ -0,0 +1,75 @@
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from app.bart_guard import BartGuard, CascadeClassifier, LABEL_IN
+from guard_corpus import GOLDEN, build_corpus
+
+
+def evaluate(model: CascadeClassifier, texts, targets):
+    """
+    Per band ("accept" = in-domain, "reject" = out of scope): how many inputs the cascade decides alone,
+    and how many of those decisions BART agrees with (the band's precision).
+    """
+    counts = {"accept": [0, 0], "reject": [0, 0]}
+    for text, y in zip(texts, targets):
+        res = model.decide(text)
+        if res is None:
+            continue
+        band = counts["accept" if res.label == LABEL_IN else "reject"]
+        band[0] += 1
+        bart_label = max(y, key=y.get)
+        band[1] += (res.label == LABEL_IN) == (bart_label == LABEL_IN)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the cheap first-stage guard classifier from BART scores.")
+    parser.add_argument("--corpus", nargs="*", default=[], help="extra JSONL files with text/input/situation fields")
+    parser.add_argument("--out", default="models/guard_cascade.json")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    args = parser.parse_args()
+
+    golden = json.loads(GOLDEN.read_text())
+    # The golden dataset scores the guard (scripts/evaluate.py, the threshold sweeps); a cascade trained on it
+    # would settle those cases from memory and make its bands and skipped_bart_fraction look better than they are
+    texts = build_corpus(args.corpus, exclude=[case["input"] for case in golden])
+    print(f"Labelling {len(texts)} messages with BartGuard...")
+    guard = BartGuard()
+    guard.cascade = None
+    guard.cache.max_size = 0
+    targets = []
+    for start in range(0, len(texts), 16):
+        targets += [res.scores for res in guard.classify_batch(texts[start:start + 16])]
+
+    order = list(range(len(texts)))
+    random.Random(0).shuffle(order)
+    cut = int(len(order) * (1 - args.holdout))
+    train_idx, test_idx = order[:cut], order[cut:]
+
+    if test_idx:
+        # The only precision reported: the model scored here has not seen these messages
+        model = CascadeClassifier.train([texts[i] for i in train_idx], [targets[i] for i in train_idx], epochs=args.epochs)
+        counts = evaluate(model, [texts[i] for i in test_idx], [targets[i] for i in test_idx])
+        decided = sum(n for n, _ in counts.values())
+        print(f"Holdout: {len(test_idx)} messages | skipped BART: {decided / len(test_idx):.1%} "
+              f"(accept={model.accept}, reject={model.reject})")
+        for band, (n, agree) in counts.items():
+            precision = f"{agree / n:.1%}" if n else "n/a"
+            print(f"  {band}: {n} decided | precision vs BART: {precision}")
+
+    # Final model on the whole training corpus (still without the golden inputs)
+    model = CascadeClassifier.train(texts, targets, epochs=args.epochs)
+    model.save(args.out)
+    print(f"Saved cascade to {args.out}; set GUARD_CASCADE_PATH={args.out} to enable it.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.bart_guard import BartGuard
+
+TOLERANCE = 1e-4
+
+
+def test_engine_parity():
+    """
+    Parity check: the direct torch engine must return the same GuardResult scores
+    as the transformers zero-shot pipeline it replaces.
+    """
+    dataset = json.loads(Path("tests/golden_dataset.json").read_text())
+    texts = [case["input"] for case in dataset]
+
+    print("Loading pipeline and direct engines...")
+    reference = BartGuard(backend="pipeline")
+    direct = BartGuard(backend="torch")
+    # Compare raw inference, not cached verdicts
+    reference.cache.max_size = 0
+    direct.cache.max_size = 0
+
+    start = time.perf_counter()
+    expected = [reference.classify(t) for t in texts]
+    ref_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [direct.classify(t) for t in texts]
+    direct_time = time.perf_counter() - start
+
+    worst = 0.0
+    failures = 0
+    for text, exp, act in zip(texts, expected, actual):
+        diff = max(abs(exp.scores[lbl] - act.scores[lbl]) for lbl in exp.scores)
+        worst = max(worst, diff)
+        if exp.label != act.label or diff > TOLERANCE:
+            failures += 1
+            print(f"MISMATCH: {text[:60]!r} pipeline={exp.label} direct={act.label} max_diff={diff:.2e}")
+
+    # Batched scoring must match one-at-a-time scoring as well
+    batched = direct.classify_batch(texts[:8])
+    for single, multi in zip(actual[:8], batched):
+        diff = max(abs(single.scores[lbl] - multi.scores[lbl]) for lbl in single.scores)
+        worst = max(worst, diff)
+        if single.label != multi.label or diff > TOLERANCE:
+            failures += 1
+            print(f"BATCH MISMATCH: label={single.label}/{multi.label} max_diff={diff:.2e}")
+
+    print(f"\nCases: {len(texts)} | max score diff: {worst:.2e} | failures: {failures}")
+    print(f"Pipeline: {ref_time:.2f}s | Direct engine: {direct_time:.2f}s")
+    if failures:
+        sys.exit(1)
+    print("PASS: direct engine matches the pipeline")
+
+
+if __name__ == "__main__":
+    test_engine_parity()
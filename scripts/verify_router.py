@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from app.groq_client import AsyncGroqClient
+from app.http_pool import close_shared_async_client
+from app.llm_router import CircuitBreaker, RoutingLLMClient
+from app.ollama_client import AsyncOllamaClient
+from fake_llm_server import FakeLLMServer
+
+MESSAGES = [{"role": "user", "content": "My son games until 2am and I am worried."}]
+
+
+def build_router(groq: FakeLLMServer, ollama: FakeLLMServer, hedge_ms: float, failures: int = 3, cooldown: float = 1.0):
+    return RoutingLLMClient(
+        AsyncGroqClient(api_key="fake", base_url=groq.url + "/openai/v1"),
+        AsyncOllamaClient(base_url=ollama.url),
+        fallback_model="fake-llama",
+        breaker=CircuitBreaker(failures=failures, cooldown=cooldown),
+        initial_hedge_delay_ms=hedge_ms,
+        min_hedge_delay_ms=hedge_ms,
+    )
+
+
+async def stream_text(router: RoutingLLMClient) -> str:
+    return "".join([piece async for piece in router.chat_stream("fake-groq", MESSAGES, max_tokens=20)])
+
+
+async def check_hedging(checks: list):
+    """A stalled Groq is hedged after the delay and the fast Ollama answer is used."""
+    groq = FakeLLMServer(latency_ms=3000, tokens=20).start()
+    ollama = FakeLLMServer(latency_ms=50, tokens=20).start()
+    router = build_router(groq, ollama, hedge_ms=200)
+
+    start = time.perf_counter()
+    reply = await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    elapsed = time.perf_counter() - start
+    checks.append(("hedged chat answered by Ollama", bool(reply) and router.wins["fallback"] == 1 and router.hedged == 1))
+    checks.append((f"hedged chat well under Groq's latency ({elapsed * 1000:.0f}ms)", elapsed < 1.5))
+
+    start = time.perf_counter()
+    text = await stream_text(router)
+    elapsed = time.perf_counter() - start
+    checks.append(("hedged stream answered by Ollama", bool(text) and router.wins["fallback"] == 2 and router.hedged == 2))
+    checks.append((f"hedged stream well under Groq's latency ({elapsed * 1000:.0f}ms)", elapsed < 1.5))
+    # A slow primary is not a failed one
+    checks.append(("hedging leaves the breaker closed", router.breaker.state == "closed"))
+    groq.shutdown()
+    ollama.shutdown()
+
+
+async def check_fast_primary(checks: list):
+    """A healthy Groq answers on its own; Ollama is never called."""
+    groq = FakeLLMServer(latency_ms=20, tokens=20).start()
+    ollama = FakeLLMServer(latency_ms=20, tokens=20).start()
+    router = build_router(groq, ollama, hedge_ms=500)
+    await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    await stream_text(router)
+    checks.append(("fast Groq is not hedged", router.hedged == 0 and router.wins["primary"] == 2 and ollama.requests == 0))
+    groq.shutdown()
+    ollama.shutdown()
+
+
+async def check_failover_and_breaker(checks: list):
+    """Groq 500s fail over to Ollama, open the breaker, and a recovered Groq closes it again."""
+    groq = FakeLLMServer(latency_ms=10, tokens=20, fail_status=500).start()
+    ollama = FakeLLMServer(latency_ms=10, tokens=20).start()
+    router = build_router(groq, ollama, hedge_ms=0, failures=3, cooldown=0.5)
+
+    reply = await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    text = await stream_text(router)
+    checks.append(("Groq error fails over to Ollama (chat and stream)", bool(reply) and bool(text) and router.failovers == 2))
+
+    await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    checks.append(("breaker opens after 3 consecutive failures", router.breaker.state == "open"))
+
+    sent = groq.requests
+    await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    checks.append(("open breaker skips Groq", groq.requests == sent))
+
+    groq.fail_status = 0
+    await asyncio.sleep(0.6)
+    await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    checks.append(("half-open trial succeeds and closes the breaker", router.breaker.state == "closed" and groq.requests == sent + 1))
+    groq.shutdown()
+    ollama.shutdown()
+
+
+async def check_retry_after(checks: list):
+    """A 429's Retry-After keeps the breaker open for longer than the cooldown."""
+    groq = FakeLLMServer(latency_ms=10, tokens=20, fail_status=429, retry_after=2).start()
+    ollama = FakeLLMServer(latency_ms=10, tokens=20).start()
+    router = build_router(groq, ollama, hedge_ms=0, failures=1, cooldown=0.1)
+    await router.chat("fake-groq", MESSAGES, max_tokens=20)
+    await asyncio.sleep(0.3)
+    checks.append(("429 Retry-After holds the breaker open", router.breaker.state == "open" and router.breaker.open_for >= 2))
+    groq.shutdown()
+    ollama.shutdown()
+
+
+async def main():
+    checks = []
+    try:
+        await check_fast_primary(checks)
+        await check_hedging(checks)
+        await check_failover_and_breaker(checks)
+        await check_retry_after(checks)
+    finally:
+        await close_shared_async_client()
+
+    failures = 0
+    for name, ok in checks:
+        print(f"{'PASS' if ok else 'FAIL'}: {name}")
+        failures += not ok
+    print(f"\nChecks: {len(checks)} | failures: {failures}")
+    if failures:
+        sys.exit(1)
+    print("PASS: router hedges, fails over and trips its breaker as expected")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Tests import the app package from the project root, like the scripts do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def tiny_nli_model(tmp_path_factory):
+    """
+    A randomly initialised two-layer BART NLI checkpoint with a character-level tokenizer, saved locally,
+    so engine tests run against the installed transformers/torch without downloading bart-large-mnli.
+    """
+    pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    path = tmp_path_factory.mktemp("tiny-nli")
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3, "<mask>": 4}
+    for ch in "abcdefghijklmnopqrstuvwxyz0123456789.,?!'":
+        vocab[ch] = len(vocab)
+        vocab["Ġ" + ch] = len(vocab)
+    vocab["Ġ"] = len(vocab)
+    (path / "vocab.json").write_text(json.dumps(vocab))
+    (path / "merges.txt").write_text("#version: 0.2\n")
+    tokenizer = transformers.BartTokenizer(str(path / "vocab.json"), str(path / "merges.txt"))
+    tokenizer.save_pretrained(path)
+
+    config = transformers.BartConfig(
+        vocab_size=len(vocab), d_model=16, encoder_layers=1, decoder_layers=1,
+        encoder_attention_heads=2, decoder_attention_heads=2, encoder_ffn_dim=32, decoder_ffn_dim=32,
+        max_position_embeddings=256,
+        id2label={0: "contradiction", 1: "neutral", 2: "entailment"},
+        label2id={"contradiction": 0, "neutral": 1, "entailment": 2},
+    )
+    transformers.set_seed(0)
+    transformers.BartForSequenceClassification(config).save_pretrained(path)
+    return str(path)
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.bart_guard import LABEL_IN, LABEL_LEGAL, GuardResult
+from app.response_cache import ResponseCache
+from app.session_manager import SessionStore
+
+
+class FakeGuard:
+    async def should_refuse_async(self, text):
+        refused = "court" in text
+        label = LABEL_LEGAL if refused else LABEL_IN
+        return refused, GuardResult(label=label, confidence=0.9, scores={label: 0.9})
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+        self.fail_stream = False
+
+    async def chat(self, **kwargs):
+        self.calls += 1
+        return "Try asking how his day went."
+
+    async def chat_stream(self, **kwargs):
+        yield "Try asking "
+        if self.fail_stream:
+            raise RuntimeError("connection reset")
+        yield "how his day went."
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = SessionStore(None, "test-model", max_sessions=2, idle_ttl=0)
+    monkeypatch.setattr(main, "session_store", store)
+    return store
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = FakeLLM()
+    monkeypatch.setattr(main.components, "llm", llm)
+    return llm
+
+
+@pytest.fixture
+def client(monkeypatch, store, llm):
+    async def ready():
+        return None
+
+    monkeypatch.setattr(main.components, "start", lambda: None)
+    monkeypatch.setattr(main.components, "wait_ready", ready)
+    monkeypatch.setattr(main.components, "guard", FakeGuard())
+    monkeypatch.setattr(main, "response_cache", ResponseCache(max_size=16, cache_dir=""))
+    return TestClient(main.app)
+
+
+def test_refused_speculative_request_leaves_sessions_alone(client, store, monkeypatch):
+    monkeypatch.setattr(main, "SPECULATIVE_LLM", True)
+    asyncio.run(store.add_message("a", "user", "my son is quiet"))
+    asyncio.run(store.add_message("b", "user", "my daughter is angry"))
+
+    resp = client.post("/chat", json={"session_id": "new", "situation": "can I take him to court"})
+
+    assert resp.status_code == 200
+    assert resp.json()["refused"] is True
+    # The store was already full: looking up "new" must neither add it nor evict "a"
+    assert list(store.sessions) == ["a", "b"]
+    assert store.evicted == 0
+
+
+def test_prompt_context_without_create_is_read_only(store):
+    asyncio.run(store.add_message("a", "user", "my son is quiet"))
+    asyncio.run(store.add_message("b", "user", "my daughter is angry"))
+
+    assert asyncio.run(store.prompt_context("unknown", create=False)) == "No previous context."
+    assert "my son is quiet" in asyncio.run(store.prompt_context("a", create=False))
+    # Neither lookup created a session or moved "a" to the back of the LRU order
+    assert list(store.sessions) == ["a", "b"]
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_commits_a_finished_reply(client, store):
+    resp = client.post("/chat/stream", json={"session_id": "s", "situation": "my son is quiet"})
+
+    events = sse_events(resp.text)
+    assert [name for name, _ in events] == ["meta", "token", "token", "done"]
+    assert events[-1][1]["response"] == "Try asking how his day went."
+    assert [m.content for m in store.peek("s").messages] == ["my son is quiet", "Try asking how his day went."]
+    assert len(main.response_cache._entries) == 1
+
+
+def test_stream_failing_midway_leaves_session_and_cache_alone(client, store, llm):
+    llm.fail_stream = True
+
+    resp = client.post("/chat/stream", json={"session_id": "s", "situation": "my son is quiet"})
+
+    events = sse_events(resp.text)
+    assert [name for name, _ in events] == ["meta", "token", "error"]
+    assert events[-1][1]["detail"] == main.LLM_ERROR_REPLY
+    assert store.peek("s") is None
+    assert len(main.response_cache._entries) == 0
+    assert main.admission.active == 0
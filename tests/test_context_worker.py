@@ -0,0 +1,44 @@
+import asyncio
+
+from app.context_worker import ContextUpdater
+from app.session_manager import SessionStore
+
+
+class FakeLLM:
+    def __init__(self, fail):
+        self.fail = fail
+
+    async def chat(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return "Son is quiet after school."
+
+
+def run_job(fail):
+    async def run():
+        store = SessionStore(FakeLLM(fail), "test-model", idle_ttl=0)
+        await store.add_message("s", "user", "my son is quiet")
+        updater = ContextUpdater(store, workers=1)
+        updater.schedule("s")
+        while updater.stats()["queue_depth"] or updater.stats()["running"]:
+            await asyncio.sleep(0.01)
+        await updater.stop()
+        return store.peek("s"), updater.stats()
+
+    return asyncio.run(run())
+
+
+def test_successful_job_counts_as_completed():
+    session, stats = run_job(fail=False)
+
+    assert (stats["completed"], stats["failed"]) == (1, 0)
+    assert session.derived_context == "Son is quiet after school."
+    assert session.distilled_upto == 1
+
+
+def test_failed_job_counts_as_failed_not_completed():
+    session, stats = run_job(fail=True)
+
+    assert (stats["completed"], stats["failed"]) == (0, 1)
+    # The failed update left the session's context alone, so the messages are still undistilled
+    assert session.distilled_upto == 0
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.bart_guard import LABEL_IN, LABEL_LEGAL, GuardResult
+
+
+class FakeGuard:
+    async def should_refuse_async(self, text):
+        refused = "court" in text
+        label = LABEL_LEGAL if refused else LABEL_IN
+        return refused, GuardResult(label=label, confidence=0.9, scores={label: 0.9})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def ready():
+        return None
+
+    # Keep the lifespan from loading the real guard model
+    monkeypatch.setattr(main.components, "start", lambda: None)
+    monkeypatch.setattr(main.components, "wait_ready", ready)
+    monkeypatch.setattr(main.components, "guard", FakeGuard())
+    return TestClient(main.app)
+
+
+def chunked(lines, size=7):
+    data = "\n".join(lines).encode("utf-8")
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_guard_batch_streams_one_verdict_per_line(client):
+    lines = [json.dumps({"id": i, "text": f"my son {i}"}) for i in range(300)]
+    lines[5] = json.dumps({"id": 5, "text": "can I take him to court"})
+    lines[9] = "not json"
+
+    resp = client.post("/guard/batch", content=chunked(lines))
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r["line"] for r in results] == list(range(1, 301))
+    assert results[5]["refused"] is True and results[5]["label"] == LABEL_LEGAL
+    assert "error" in results[9]
+    assert results[0] == {"line": 1, "id": 0, "refused": False, "label": LABEL_IN, "confidence": 0.9}
+    assert main.bulk_admission.active == 0
+
+
+def test_guard_batch_is_capped_separately_from_chat(client, monkeypatch):
+    monkeypatch.setattr(main.bulk_admission, "max_concurrency", 1)
+    monkeypatch.setattr(main.bulk_admission, "max_queue", 0)
+    monkeypatch.setattr(main.bulk_admission, "_slots", None)
+
+    async def occupy():
+        await main.bulk_admission.acquire()
+
+    # Hold the only bulk slot from the app's own loop, then a second upload is turned away
+    with client:
+        client.portal.call(occupy)
+        resp = client.post("/guard/batch", content=b'{"text": "hi"}\n')
+        assert resp.status_code == 429
+        assert "retry-after" in resp.headers
+        client.portal.call(main.bulk_admission.release)
+    assert main.admission.active == 0
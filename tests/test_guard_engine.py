@@ -0,0 +1,48 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from app.bart_guard import DESCRIPTIONS, HYPOTHESIS_TEMPLATE
+from app.guard_engine import PipelineNliEngine, TorchNliEngine
+
+HYPOTHESES = {label: HYPOTHESIS_TEMPLATE.format(desc) for label, desc in DESCRIPTIONS.items()}
+TEXTS = [
+    "My son games until 2am and I am worried.",
+    "How do I read my daughter's messages?",
+    "ok",
+]
+
+
+def test_encode_pairs_every_premise_with_every_hypothesis(tiny_nli_model):
+    engine = TorchNliEngine(tiny_nli_model, HYPOTHESES)
+    batch = engine.encode(TEXTS)
+
+    assert batch["input_ids"].shape[0] == len(TEXTS) * len(HYPOTHESES)
+    assert batch["input_ids"].shape == batch["attention_mask"].shape
+    # Row i*labels + j is exactly what the tokenizer builds for (premise i, hypothesis j), before padding
+    for i, text in enumerate(TEXTS):
+        for j, hyp in enumerate(HYPOTHESES.values()):
+            row = i * len(HYPOTHESES) + j
+            expected = engine.tokenizer(text, hyp)["input_ids"]
+            length = int(batch["attention_mask"][row].sum())
+            assert batch["input_ids"][row, :length].tolist() == expected
+
+
+def test_encode_truncates_only_the_premise(tiny_nli_model):
+    engine = TorchNliEngine(tiny_nli_model, HYPOTHESES)
+    batch = engine.encode(["word " * 500])
+
+    assert batch["input_ids"].shape[1] == engine.max_length
+    hyp_ids = engine.tokenizer(list(HYPOTHESES.values())[0], add_special_tokens=False)["input_ids"]
+    row = batch["input_ids"][0].tolist()
+    assert row[-len(hyp_ids) - 1:-1] == hyp_ids
+
+
+def test_scores_match_the_zero_shot_pipeline(tiny_nli_model):
+    direct = TorchNliEngine(tiny_nli_model, HYPOTHESES).score(TEXTS)
+    reference = PipelineNliEngine(tiny_nli_model, HYPOTHESES).score(TEXTS)
+
+    for exp, act in zip(reference, direct):
+        assert abs(sum(act.values()) - 1.0) < 1e-5
+        assert max(abs(exp[label] - act[label]) for label in exp) < 1e-5
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from app.bart_guard import DESCRIPTIONS, HYPOTHESIS_TEMPLATE
+from app.guard_engine import TorchNliEngine
+from app.guard_onnx import OnnxNliEngine, export_onnx
+
+HYPOTHESES = {label: HYPOTHESIS_TEMPLATE.format(desc) for label, desc in DESCRIPTIONS.items()}
+TEXTS = ["My son games until 2am and I am worried.", "How do I read my daughter's messages?"]
+
+
+@pytest.fixture
+def onnx_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("BART_ONNX_CACHE", str(tmp_path))
+    return tmp_path
+
+
+@pytest.mark.parametrize("quantized", [False, True])
+def test_export_and_score(tiny_nli_model, onnx_cache, quantized):
+    path = export_onnx(tiny_nli_model, quantized=quantized)
+
+    assert path.exists()
+    # Nothing is left behind in temp directories
+    assert not [p for p in path.parent.iterdir() if p.name.startswith(".")]
+    reference = TorchNliEngine(tiny_nli_model, HYPOTHESES).score(TEXTS)
+    scores = OnnxNliEngine(tiny_nli_model, HYPOTHESES, quantized=quantized).score(TEXTS)
+    tolerance = 0.05 if quantized else 1e-4
+    for exp, act in zip(reference, scores):
+        assert max(abs(exp[label] - act[label]) for label in exp) < tolerance
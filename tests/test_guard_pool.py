@@ -0,0 +1,98 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from app.bart_guard import BartGuard
+from app.guard_pool import GuardPool
+
+TEXTS = [
+    "My son games until 2am and I am worried.",
+    "How do I read my daughter's messages?",
+    "She slammed the door again, what do I say?",
+    "Can I sue my ex for custody?",
+    "ok",
+]
+
+
+@pytest.mark.parametrize("load_model", [True, False], ids=["shared-weights", "replica-loads"])
+def test_pool_starts_from_a_running_event_loop(tiny_nli_model, monkeypatch, load_model):
+    monkeypatch.delenv("GUARD_CASCADE_PATH", raising=False)
+    reference = BartGuard(model_name=tiny_nli_model, backend="torch")
+    expected = reference.classify_batch(TEXTS)
+
+    async def run():
+        # As the app does it: built on a worker thread while the loop (and torch's threads) are running
+        parent = BartGuard(model_name=tiny_nli_model, backend="torch", load_model=load_model)
+        pool = await asyncio.to_thread(GuardPool, parent, replicas=2, threads=1, start_timeout=120)
+        try:
+            verdicts = await asyncio.wait_for(
+                asyncio.gather(*(pool.should_refuse_async(text) for text in TEXTS)), 60
+            )
+            return verdicts, pool.stats()
+        finally:
+            await asyncio.to_thread(pool.close)
+
+    verdicts, stats = asyncio.run(run())
+
+    assert all(stats["per_replica"][i]["alive"] for i in range(2))
+    assert stats["shared_weights"] is load_model
+    assert stats["items"] == len(TEXTS)
+    for (refused, res), want in zip(verdicts, expected):
+        assert res.label == want.label
+        assert refused == reference.is_refusal(want)
+        for label, score in want.scores.items():
+            assert res.scores[label] == pytest.approx(score, abs=1e-5)
+
+
+def memory_mb(pid):
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        key, value = line.split(":")
+        fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+
+@pytest.fixture(scope="module")
+def dense_nli_model(tiny_nli_model, tmp_path_factory):
+    """The tiny checkpoint with wide feed-forward layers: ~250 MB of weights that every forward pass touches."""
+    transformers = pytest.importorskip("transformers")
+
+    path = tmp_path_factory.mktemp("dense-nli")
+    config = transformers.BartConfig.from_pretrained(tiny_nli_model)
+    config.update({"d_model": 768, "encoder_ffn_dim": 8192, "decoder_ffn_dim": 8192,
+                   "encoder_layers": 2, "decoder_layers": 2})
+    transformers.set_seed(0)
+    transformers.BartForSequenceClassification(config).save_pretrained(path)
+    transformers.AutoTokenizer.from_pretrained(tiny_nli_model).save_pretrained(path)
+    return str(path)
+
+
+@pytest.mark.skipif(not Path("/proc/self/smaps_rollup").exists(), reason="needs Linux smaps_rollup")
+def test_replicas_share_the_weights(dense_nli_model, monkeypatch):
+    monkeypatch.delenv("GUARD_CASCADE_PATH", raising=False)
+    guard = BartGuard(model_name=dense_nli_model, backend="torch")
+    weights_mb = sum(p.numel() * p.element_size() for p in guard.engine.model.parameters()) / 2 ** 20
+
+    def replica_memory(replicas):
+        pool = GuardPool(guard, replicas=replicas, threads=1, start_timeout=120)
+        try:
+            # One message per replica, so each runs a full forward pass over every weight
+            for fut in [pool.submit(f"{text} {replicas}") for text in TEXTS[:replicas]]:
+                fut.result(timeout=60)
+            return [memory_mb(pid) for pid in pool.pids]
+        finally:
+            pool.close()
+
+    one = replica_memory(1)
+    two = replica_memory(2)
+
+    for mem in one + two:
+        # The weights are mapped from the parent's shared memory, not copied into the replica
+        assert mem["Shared_Dirty"] >= 0.8 * weights_mb
+    private = [m["Private_Clean"] + m["Private_Dirty"] for m in one + two]
+    # A second replica costs its runtime, not another copy of the weights
+    assert max(private[1:]) < private[0] + weights_mb / 2
@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+from app.bart_guard import LABEL_IN, GuardResult
+from app.guard_service import GuardClient, GuardServer
+
+
+class FakeBatcher:
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.hold = False
+
+    async def should_refuse_async(self, text):
+        if self.hold:
+            await self.release.wait()
+        return False, GuardResult(label=LABEL_IN, confidence=0.9, scores={LABEL_IN: 0.9})
+
+    def stats(self):
+        return {"items": 0}
+
+
+async def serving(path, batcher):
+    return await asyncio.start_unix_server(GuardServer(str(path), batcher=batcher)._handle, path=str(path))
+
+
+def test_malformed_line_gets_an_error_and_the_connection_survives(tmp_path):
+    path = tmp_path / "guard.sock"
+
+    async def run():
+        server = await serving(path, FakeBatcher())
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(str(path))
+            writer.write(b'{"id": 1, "text": "my son"}\n{"id": 2, "text": \n[3]\n{"id": 4, "text": "my teen"}\n')
+            await writer.drain()
+            replies = [json.loads(await reader.readline()) for _ in range(4)]
+            writer.close()
+            return replies
+
+    replies = asyncio.run(run())
+
+    ok = sorted(r["id"] for r in replies if "error" not in r)
+    errors = [r for r in replies if "error" in r]
+    assert ok == [1, 4]
+    assert len(errors) == 2 and all(r["id"] is None for r in errors)
+    assert all("malformed request" in r["error"] for r in errors)
+
+
+def test_client_close_cancels_the_reader_and_fails_pending_requests(tmp_path):
+    path = tmp_path / "guard.sock"
+
+    async def run():
+        batcher = FakeBatcher()
+        batcher.hold = True
+        server = await serving(path, batcher)
+        async with server:
+            client = GuardClient(str(path), timeout=10)
+            call = asyncio.create_task(client.should_refuse_async("my son"))
+            while not client._pending:
+                await asyncio.sleep(0.01)
+            reader_task = client._reader_task
+            await client.close()
+            with pytest.raises(ConnectionError):
+                await call
+            batcher.release.set()
+            return reader_task
+
+    reader_task = asyncio.run(run())
+
+    assert reader_task.done()
+
+
+def test_client_reconnects_after_the_server_drops_it(tmp_path):
+    path = tmp_path / "guard.sock"
+
+    async def run():
+        server = await serving(path, FakeBatcher())
+        async with server:
+            client = GuardClient(str(path), timeout=10)
+            assert (await client.should_refuse_async("my son"))[0] is False
+            first = client._reader_task
+            # The server side goes away: the reader sees EOF and the next call opens a new connection
+            client._writer.transport.abort()
+            await asyncio.wait_for(first, 5)
+            refused, res = await client.should_refuse_async("my teen")
+            assert client._reader_task is not first
+            await client.close()
+            return refused, res
+
+    refused, res = asyncio.run(run())
+
+    assert refused is False and res.label == LABEL_IN
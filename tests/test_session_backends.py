@@ -0,0 +1,109 @@
+import asyncio
+import sqlite3
+import threading
+
+from app.session_backends import SqliteBackend
+from app.session_manager import SessionStore
+
+
+def rows(path, sql):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_sqlite_flush_trims_history(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    backend = SqliteBackend(path, flush_ms=60000, max_messages=4)
+    store = SessionStore(None, "test-model", max_messages=4, backend=backend)
+
+    async def add():
+        for i in range(10):
+            await store.add_message("s", "user", f"message {i}")
+
+    asyncio.run(add())
+    backend.close()
+
+    assert rows(path, "SELECT content FROM messages ORDER BY id") == [(f"message {i}",) for i in range(6, 10)]
+    assert rows(path, "SELECT message_count FROM sessions") == [(10,)]
+    # A fresh store reads the same window back, with the true message count
+    reloaded = SessionStore(None, "test-model", max_messages=4, backend=SqliteBackend(path, max_messages=4))
+    session = asyncio.run(reloaded.get_session("s"))
+    assert [m.content for m in session.messages] == [f"message {i}" for i in range(6, 10)]
+    assert session.message_count == 10
+    reloaded.backend.close()
+
+
+def test_sqlite_flush_deletes_idle_and_least_recent_sessions(tmp_path, monkeypatch):
+    path = str(tmp_path / "sessions.db")
+    backend = SqliteBackend(path, flush_ms=60000, max_sessions=2, idle_ttl=100)
+    clock = [1000.0]
+    monkeypatch.setattr("app.session_backends.time.time", lambda: clock[0])
+    backend.append_message("idle", "user", "hi")
+    backend.flush()
+
+    clock[0] = 1200.0
+    for session_id in ("a", "b", "c"):
+        clock[0] += 1
+        backend.append_message(session_id, "user", "hi")
+    backend.flush()
+
+    # "idle" outlived SESSION_IDLE_TTL; "a" is the least recently active beyond SESSION_MAX_COUNT
+    assert rows(path, "SELECT session_id FROM sessions ORDER BY session_id") == [("b",), ("c",)]
+    assert rows(path, "SELECT DISTINCT session_id FROM messages ORDER BY session_id") == [("b",), ("c",)]
+    assert backend.deleted == 2
+    assert backend.load("a", 20) is None
+    backend.close()
+
+
+def test_sqlite_reads_overlay_queued_writes_off_the_loop(tmp_path, monkeypatch):
+    backend = SqliteBackend(str(tmp_path / "sessions.db"), flush_ms=60000)
+    store = SessionStore(None, "test-model", backend=backend)
+    load = backend.load
+    threads = []
+
+    def recording_load(*args):
+        threads.append(threading.get_ident())
+        return load(*args)
+
+    monkeypatch.setattr(backend, "load", recording_load)
+
+    async def run():
+        await store.add_message("s", "user", "my son is quiet")
+        store.sessions.clear()
+        return await store.prompt_context("s", create=False)
+
+    context = asyncio.run(run())
+
+    # The queued append is visible without a flush, and the read did not run on the loop's thread
+    assert "my son is quiet" in context
+    assert backend.flushes == 0
+    assert threads and threading.get_ident() not in threads
+    backend.close()
+
+
+def test_cached_session_is_reread_after_another_worker_writes(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    # Two workers on one database; each has its own write-behind queue and cache
+    first = SessionStore(None, "test-model", update_every_turns=2, backend=SqliteBackend(path, flush_ms=60000))
+    second = SessionStore(None, "test-model", update_every_turns=2, backend=SqliteBackend(path, flush_ms=60000))
+
+    async def run():
+        await first.add_message("s", "user", "my son is quiet")
+        first.backend.flush()
+        await second.add_message("s", "assistant", "Ask him about his day.")
+        await second.add_message("s", "user", "he slammed the door")
+        second.backend.flush()
+        # Within what used to be the cache TTL: the first worker must still see the second one's turn
+        await first.add_message("s", "assistant", "Give him some space first.")
+        return first.peek("s")
+
+    session = asyncio.run(run())
+
+    assert session.message_count == 4
+    assert [m.content for m in session.messages][-2:] == ["he slammed the door", "Give him some space first."]
+    assert first.needs_context_update("s")
+    first.backend.close()
+    second.backend.close()
@@ -48,6 +48,7 @@ function addMessage({ role, text, metaChips = [], refused = false }) {
 
   chatEl.appendChild(msg);
   scrollToBottom();
+  return { msg, bubble, meta };
 }
 
 function chip(text, kind = "good") {
@@ -76,6 +77,42 @@ function showTyping(show) {
   }
 }
 
+function guardChips(data) {
+  const chips = [];
+  if (data.refused) {
+    const g = data.guard_label ?? "UNKNOWN";
+    const conf = typeof data.guard_confidence === "number" ? data.guard_confidence : null;
+    const confText = conf === null ? "" : ` ${conf.toFixed(2)}`;
+    chips.push(chip(`guard=${g}${confText}`, "bad"));
+    chips.push(chip("REFUSED", "bad"));
+  }
+  return chips;
+}
+
+// Parses a text/event-stream body and calls onEvent(name, data) per event.
+async function readEvents(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      onEvent(event, data ? JSON.parse(data) : {});
+    }
+  }
+}
+
 async function send() {
   const situation = inputEl.value.trim();
   if (!situation || isLoading) return;
@@ -87,42 +124,62 @@ async function send() {
   setLoading(true);
   showTyping(true);
 
+  let reply = null;
+  let text = "";
+  let verdict = {};
+
   try {
-    const res = await fetch("/chat", {
+    const res = await fetch("/chat/stream", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ situation, session_id: sessionId })
     });
-
-    const data = await res.json();
-    showTyping(false);
-
-    const g = data.guard_label ?? "UNKNOWN";
-    const conf = typeof data.guard_confidence === "number" ? data.guard_confidence : null;
-    const refused = !!data.refused;
-
-    const chips = [];
-    if (refused) {
-      const confText = conf === null ? "" : ` ${conf.toFixed(2)}`;
-      chips.push(chip(`guard=${g}${confText}`, "bad"));
-      chips.push(chip("REFUSED", "bad"));
+    if (!res.ok || !res.body) {
+      // 429/503 mean the server is busy or still starting; show its message instead of a generic error
+      const detail = await res.json().then((d) => d.detail).catch(() => null);
+      const error = new Error(`HTTP ${res.status}`);
+      error.detail = typeof detail === "string" ? detail : null;
+      error.busy = res.status === 429 || res.status === 503;
+      throw error;
     }
 
-    addMessage({
-      role: "pace",
-      text: (data.response ?? "").trim(),
-      metaChips: chips,
-      refused
+    await readEvents(res, (event, data) => {
+      if (event === "meta") {
+        verdict = data;
+      } else if (event === "token") {
+        // Render the bubble on the first token and grow it as text arrives
+        if (!reply) {
+          showTyping(false);
+          reply = addMessage({ role: "pace", text: "", metaChips: guardChips(verdict), refused: !!verdict.refused });
+        }
+        text += data.text ?? "";
+        reply.bubble.textContent = text;
+        scrollToBottom();
+      } else if (event === "done" && reply) {
+        reply.bubble.textContent = (data.response ?? text).trim();
+      } else if (event === "error") {
+        // The reply was not saved; mark any partial text as interrupted, or show the server's message
+        const error = new Error("stream error");
+        error.detail = data.detail ?? null;
+        throw error;
+      }
     });
 
+    showTyping(false);
+    if (!reply) throw new Error("empty stream");
+
   } catch (err) {
     showTyping(false);
-    addMessage({
-      role: "pace",
-      text: "Sorry — something went wrong with the connection.",
-      metaChips: [chip("ERROR", "bad")],
-      refused: true
-    });
+    if (reply) {
+      reply.meta.innerHTML += chip("INTERRUPTED", "warn");
+    } else {
+      addMessage({
+        role: "pace",
+        text: err.detail || "Sorry — something went wrong with the connection.",
+        metaChips: [err.busy ? chip("BUSY", "warn") : chip("ERROR", "bad")],
+        refused: true
+      });
+    }
   } finally {
     setLoading(false);
     inputEl.focus();